@@ -0,0 +1,121 @@
+# Times have, compare and can-execute against synthetic conda installations of
+# increasing size, with a cold and a warm cache, and records the results as JSON.
+# Runs offline and needs no real conda installation.
+#
+#   python benchmarks/bench_scaling.py --envs 10 100 1000 --output results.json
+#   python benchmarks/bench_scaling.py --baseline results.json --max-regression 1.25
+import argparse
+import json
+import os
+import os.path as osp
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, osp.dirname(osp.abspath(__file__)))
+from fake_conda import create_fake_conda, get_fake_conda_env
+
+def get_commit() -> str:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=osp.dirname(osp.abspath(__file__)), capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else 'unknown'
+    except OSError:
+        return 'unknown'
+
+def get_benchmarks(n_envs: int) -> Dict[str, List[str]]:
+    compared_envs = ' '.join(f'env{i:04d}' for i in range(min(n_envs, 10)))
+    return {
+        'have': ['have', 'numpy>=1.0 pandas requests<3'],
+        'compare': ['compare', compared_envs],
+        'can-execute': ['can-execute', 'python -c pass'],
+    }
+
+def run_condascan(args: List[str], env: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-m', 'condascan.cli', *args, '--no-daemon'], env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f'condascan {" ".join(args)} failed:\n{result.stdout}\n{result.stderr}')
+    return elapsed
+
+def run_benchmarks(n_envs: int, n_packages: int, repeat: int, skip: List[str], workdir: str) -> List[Dict]:
+    root = create_fake_conda(osp.join(workdir, f'conda-{n_envs}'), n_envs, n_packages)
+    env = get_fake_conda_env(root)
+    cache_dir = osp.join(env['HOME'], '.cache', 'condascan')
+
+    results = []
+    for name, args in get_benchmarks(n_envs).items():
+        if name in skip:
+            continue
+        cold, warm = [], []
+        for _ in range(repeat):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(run_condascan(args, env))
+            warm.append(run_condascan(args, env))
+        for mode, times in (('cold', cold), ('warm', warm)):
+            results.append({'command': name, 'mode': mode, 'envs': n_envs, 'packages': n_packages, 'seconds': statistics.median(times), 'runs': times})
+            print(f'{name:<12} {mode:<5} envs={n_envs:<5} packages={n_packages:<5} {statistics.median(times) * 1000:10.1f} ms', flush=True)
+    shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def compare_to_baseline(results: List[Dict], baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    baseline = {(x['command'], x['mode'], x['envs'], x['packages']): x['seconds'] for x in baseline['results']}
+
+    ok = True
+    print(f'\nComparison to {baseline_path} (ratio = current / baseline):')
+    for result in results:
+        key = (result['command'], result['mode'], result['envs'], result['packages'])
+        if key not in baseline:
+            continue
+        ratio = result['seconds'] / baseline[key]
+        flag = ''
+        if ratio > max_regression:
+            flag = '  REGRESSION'
+            ok = False
+        print(f'{key[0]:<12} {key[1]:<5} envs={key[2]:<5} {ratio:6.2f}x{flag}')
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark condascan against synthetic conda installations')
+    parser.add_argument('--envs', type=int, nargs='+', default=[10, 100, 1000], help='numbers of environments to benchmark with')
+    parser.add_argument('--packages', type=int, default=200, help='number of packages in each environment')
+    parser.add_argument('--repeat', type=int, default=3, help='number of measurements per benchmark')
+    parser.add_argument('--skip', type=str, nargs='*', default=[], choices=['have', 'compare', 'can-execute'], help='benchmarks to skip')
+    parser.add_argument('--output', type=str, default=None, help='write the results as JSON to this file')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results of a previous run to compare against')
+    parser.add_argument('--max-regression', type=float, default=1.25, help='fail if a benchmark is slower than the baseline by more than this factor')
+    parser.add_argument('--workdir', type=str, default=None, help='directory to generate the installations in. Defaults to a temporary directory')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='condascan-bench-')
+    results = []
+    try:
+        for n_envs in args.envs:
+            results.extend(run_benchmarks(n_envs, args.packages, args.repeat, args.skip, workdir))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.baseline is not None and not compare_to_baseline(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
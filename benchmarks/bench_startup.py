@@ -0,0 +1,71 @@
+# Measures how long it takes to import condascan.cli and to print --help, and
+# fails when the import exceeds the given budget or eagerly pulls in modules
+# that should only be loaded by the subcommand that needs them.
+#
+#   python benchmarks/bench_startup.py --budget-ms 40
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+LAZY_MODULES = ['rich', 'yaml', 'packaging', 'concurrent.futures', 'condascan.task', 'condascan.display']
+
+def measure_import() -> tuple:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import condascan.cli'], capture_output=True, text=True, check=True)
+    cumulative = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module = line[len('import time:'):].split('|')
+        module = module.strip()
+        modules.add(module)
+        if module == 'condascan.cli':
+            cumulative = int(cumulative_us)
+    return cumulative / 1000, modules
+
+def measure_help() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'condascan.cli', '--help'], capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='check the cold-start import time of condascan against a budget')
+    parser.add_argument('--budget-ms', type=float, default=40, help='maximum median import time of condascan.cli in milliseconds')
+    parser.add_argument('--runs', type=int, default=7, help='number of measurements to take')
+    parser.add_argument('--output', type=str, default=None, help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    import_times = []
+    loaded = set()
+    for _ in range(args.runs):
+        import_ms, modules = measure_import()
+        import_times.append(import_ms)
+        loaded |= modules
+    help_times = [measure_help() for _ in range(args.runs)]
+
+    eager = sorted(x for x in loaded if any(x == y or x.startswith(y + '.') for y in LAZY_MODULES))
+    results = {
+        'import_ms': statistics.median(import_times),
+        'help_ms': statistics.median(help_times),
+        'budget_ms': args.budget_ms,
+        'eager_modules': eager,
+    }
+    print(json.dumps(results, indent=4))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    failed = False
+    if results['import_ms'] > args.budget_ms:
+        print(f'FAIL: importing condascan.cli took {results["import_ms"]:.1f} ms, budget is {args.budget_ms:.1f} ms', file=sys.stderr)
+        failed = True
+    if len(eager) > 0:
+        print(f'FAIL: modules loaded at startup that should be lazy: {", ".join(eager)}', file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
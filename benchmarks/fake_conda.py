@@ -0,0 +1,181 @@
+# Generates a synthetic conda installation that condascan can scan without a real
+# conda: a base prefix plus N environments with P packages each, realistic
+# conda-meta records, pip-installed dist-info folders and a stub `conda`
+# executable that answers `--version`, `env list`, `list` and `run`.
+#
+#   python benchmarks/fake_conda.py /tmp/fake-conda --envs 100 --packages 300
+import argparse
+import json
+import os
+import os.path as osp
+import random
+import shutil
+import stat
+import sys
+from typing import Dict, List
+
+COMMON_PACKAGES = ['numpy', 'pandas', 'scipy', 'requests', 'pyyaml', 'packaging', 'setuptools', 'pip', 'wheel', 'six', 'typing-extensions', 'urllib3', 'certifi', 'idna', 'zlib', 'openssl', 'libffi', 'sqlite', 'tk', 'xz']
+CHANNELS = ['https://repo.anaconda.com/pkgs/main', 'https://conda.anaconda.org/conda-forge']
+PYTHON_VERSIONS = ['3.8.18', '3.9.19', '3.10.14', '3.11.9', '3.12.4']
+
+STUB_CONDA = '''#!{python}
+import json, os, os.path as osp, subprocess, sys
+
+ROOT = {root!r}
+
+def prefixes():
+    result = [('base', ROOT)]
+    envs_dir = osp.join(ROOT, 'envs')
+    for name in sorted(os.listdir(envs_dir)):
+        result.append((name, osp.join(envs_dir, name)))
+    return result
+
+def get_prefix(args):
+    for flag in ('-p', '--prefix'):
+        if flag in args:
+            return args[args.index(flag) + 1]
+    for flag in ('-n', '--name'):
+        if flag in args:
+            return dict(prefixes())[args[args.index(flag) + 1]]
+    return ROOT
+
+args = sys.argv[1:]
+if args[:1] == ['--version']:
+    print('conda 24.1.0')
+elif args[:2] == ['env', 'list']:
+    print('# conda environments:')
+    print('#')
+    for name, prefix in prefixes():
+        print(name.ljust(24) + prefix)
+elif args[:1] == ['list']:
+    prefix = get_prefix(args)
+    print('# packages in environment at %s:' % prefix)
+    print('#')
+    print('# Name                    Version                   Build  Channel')
+    meta = osp.join(prefix, 'conda-meta')
+    for entry in sorted(os.listdir(meta)):
+        if entry.endswith('.json'):
+            with open(osp.join(meta, entry)) as f:
+                record = json.load(f)
+            channel = record['channel'].split('/')[-2] if 'conda-forge' in record['channel'] else ''
+            print('%-26s%-26s%-26s%s' % (record['name'], record['version'], record['build'], channel))
+    for site_packages in [osp.join(prefix, 'lib', x, 'site-packages') for x in os.listdir(osp.join(prefix, 'lib'))] if osp.isdir(osp.join(prefix, 'lib')) else []:
+        for entry in sorted(os.listdir(site_packages)):
+            if entry.endswith('.dist-info') and entry.startswith('pip_'):
+                name, version = entry[:-len('.dist-info')].rsplit('-', 1)
+                print('%-26s%-26s%-26s%s' % (name, version, 'pypi_0', 'pypi'))
+elif args[:1] == ['run']:
+    prefix = get_prefix(args)
+    index = args.index('-p') + 2 if '-p' in args else args.index('-n') + 2 if '-n' in args else 1
+    env = dict(os.environ, PATH=osp.join(prefix, 'bin') + os.pathsep + os.environ.get('PATH', ''), CONDA_PREFIX=prefix)
+    sys.exit(subprocess.call(args[index:], env=env))
+else:
+    sys.stderr.write('unsupported command: %s\\n' % ' '.join(args))
+    sys.exit(1)
+'''
+
+def get_package_names(n_packages: int) -> List[str]:
+    names = list(COMMON_PACKAGES)
+    i = 0
+    while len(names) < n_packages - 1:
+        names.append(f'lib-synthetic-{i:04d}')
+        i += 1
+    return names[:n_packages - 1]
+
+def write_conda_record(prefix: str, name: str, version: str, build: str, channel: str, python_dir: str):
+    files = [f'lib/lib{name}.so', f'include/{name}.h', f'share/{name}/LICENSE']
+    if python_dir is not None and name not in ('python', 'zlib', 'openssl', 'libffi', 'sqlite', 'tk', 'xz'):
+        dist_info = f'lib/{python_dir}/site-packages/{name.replace("-", "_")}-{version}.dist-info'
+        files.extend([f'{dist_info}/METADATA', f'{dist_info}/RECORD', f'lib/{python_dir}/site-packages/{name.replace("-", "_")}/__init__.py'])
+        os.makedirs(osp.join(prefix, dist_info), exist_ok=True)
+        with open(osp.join(prefix, dist_info, 'METADATA'), 'w') as f:
+            f.write(f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n')
+    record = {
+        'build': build,
+        'build_number': 0,
+        'channel': f'{channel}/linux-64',
+        'constrains': [],
+        'depends': ['python >=3.8'] if python_dir is not None else [],
+        'files': files,
+        'fn': f'{name}-{version}-{build}.conda',
+        'license': 'MIT',
+        'md5': '0' * 32,
+        'name': name,
+        'platform': 'linux',
+        'size': 1024,
+        'subdir': 'linux-64',
+        'url': f'{channel}/linux-64/{name}-{version}-{build}.conda',
+        'version': version,
+    }
+    with open(osp.join(prefix, 'conda-meta', f'{name}-{version}-{build}.json'), 'w') as f:
+        json.dump(record, f, indent=2)
+
+def create_prefix(prefix: str, n_packages: int, rng: random.Random):
+    os.makedirs(osp.join(prefix, 'conda-meta'), exist_ok=True)
+    os.makedirs(osp.join(prefix, 'bin'), exist_ok=True)
+    python_version = rng.choice(PYTHON_VERSIONS)
+    python_dir = 'python' + '.'.join(python_version.split('.')[:2])
+    site_packages = osp.join(prefix, 'lib', python_dir, 'site-packages')
+    os.makedirs(site_packages, exist_ok=True)
+
+    with open(osp.join(prefix, 'conda-meta', 'history'), 'w') as f:
+        f.write('==> 2024-01-01 00:00:00 <==\n# cmd: conda create\n')
+    write_conda_record(prefix, 'python', python_version, 'h955ad1f_0', CHANNELS[0], None)
+    os.symlink(sys.executable, osp.join(prefix, 'bin', 'python'))
+
+    names = get_package_names(n_packages)
+    n_pip = max(1, len(names) // 10)
+    for name in rng.sample(names, len(names) - n_pip):
+        version = f'{rng.randint(0, 3)}.{rng.randint(0, 30)}.{rng.randint(0, 9)}'
+        write_conda_record(prefix, name, version, f'py{python_dir[6:].replace(".", "")}h06a4308_{rng.randint(0, 3)}', rng.choice(CHANNELS), python_dir)
+    for i in range(n_pip):
+        version = f'{rng.randint(0, 5)}.{rng.randint(0, 20)}.{rng.randint(0, 9)}'
+        dist_info = osp.join(site_packages, f'pip_package_{i:03d}-{version}.dist-info')
+        os.makedirs(dist_info, exist_ok=True)
+        with open(osp.join(dist_info, 'METADATA'), 'w') as f:
+            f.write(f'Metadata-Version: 2.1\nName: pip-package-{i:03d}\nVersion: {version}\nSummary: synthetic package\n\nLong description\n')
+
+def create_fake_conda(root: str, n_envs: int, n_packages: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    if osp.exists(root):
+        shutil.rmtree(root)
+    create_prefix(root, n_packages, rng)
+    os.makedirs(osp.join(root, 'condabin'), exist_ok=True)
+    os.makedirs(osp.join(root, 'envs'), exist_ok=True)
+    for i in range(n_envs):
+        create_prefix(osp.join(root, 'envs', f'env{i:04d}'), n_packages, rng)
+
+    stub = STUB_CONDA.format(python=sys.executable, root=osp.abspath(root))
+    for path in (osp.join(root, 'bin', 'conda'), osp.join(root, 'condabin', 'conda')):
+        with open(path, 'w') as f:
+            f.write(stub)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    home = osp.join(root, 'home')
+    os.makedirs(osp.join(home, '.conda'), exist_ok=True)
+    with open(osp.join(home, '.conda', 'environments.txt'), 'w') as f:
+        f.write('\n'.join([osp.abspath(root)] + [osp.abspath(osp.join(root, 'envs', x)) for x in sorted(os.listdir(osp.join(root, 'envs')))]) + '\n')
+    return osp.abspath(root)
+
+def get_fake_conda_env(root: str) -> Dict[str, str]:
+    env = {key: value for key, value in os.environ.items() if not key.startswith('CONDA') and key not in ('CONDARC', 'PYTHONHOME')}
+    env['HOME'] = osp.join(root, 'home')
+    env['CONDA_EXE'] = osp.join(root, 'bin', 'conda')
+    env['PATH'] = osp.join(root, 'condabin') + os.pathsep + env.get('PATH', '')
+    return env
+
+def main():
+    parser = argparse.ArgumentParser(description='generate a synthetic conda installation for benchmarking condascan')
+    parser.add_argument('root', type=str, help='directory to create the installation in. It is removed first if it exists')
+    parser.add_argument('--envs', type=int, default=10, help='number of environments besides base')
+    parser.add_argument('--packages', type=int, default=200, help='number of packages in each environment')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the generated versions')
+    args = parser.parse_args()
+
+    root = create_fake_conda(args.root, args.envs, args.packages, args.seed)
+    print(f'Created a fake conda installation with {args.envs} environments in {root}')
+    print('Run condascan against it with:')
+    print(f'  HOME={osp.join(root, "home")} CONDA_EXE={osp.join(root, "bin", "conda")} condascan have "numpy pandas"')
+
+if __name__ == '__main__':
+    main()
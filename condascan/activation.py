@@ -0,0 +1,69 @@
+import glob
+import json
+import os
+import os.path as osp
+import shlex
+import shutil
+import subprocess
+from typing import Dict, List, Union
+from condascan.profiling import count
+
+def get_env_bin_dirs(prefix: str) -> List[str]:
+    if os.name == 'nt':
+        return [
+            prefix,
+            osp.join(prefix, 'Library', 'mingw-w64', 'bin'),
+            osp.join(prefix, 'Library', 'usr', 'bin'),
+            osp.join(prefix, 'Library', 'bin'),
+            osp.join(prefix, 'Scripts'),
+            osp.join(prefix, 'bin'),
+        ]
+    return [osp.join(prefix, 'bin')]
+
+def get_config_env_vars(prefix: str) -> Dict[str, str]:
+    try:
+        with open(osp.join(prefix, 'conda-meta', 'state'), 'r') as f:
+            env_vars = json.load(f).get('env_vars', {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+    return {str(key): str(value) for key, value in env_vars.items()}
+
+def run_activate_scripts(scripts: List[str], env: Dict[str, str]) -> Union[Dict[str, str], None]:
+    # conda activates with bash, scripts may use bash syntax that sh (dash on Debian) cannot parse.
+    # A script that fails leaves the environment half activated, the caller falls back to `conda run`
+    command = ''.join(f'. {shlex.quote(script)} >/dev/null 2>&1 || exit 1; ' for script in scripts) + 'env -0'
+    shell = shutil.which('bash') or 'sh'
+    count('subprocesses')
+    try:
+        result = subprocess.run([shell, '-c', command], env=env, capture_output=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+
+    activated = {}
+    for entry in result.stdout.decode(errors='replace').split('\0'):
+        key, sep, value = entry.partition('=')
+        if sep != '' and key != '':
+            activated[key] = value
+    return activated
+
+def build_activated_env(env_name: str, prefix: str) -> Union[Dict[str, str], None]:
+    env = dict(os.environ)
+    env['PATH'] = os.pathsep.join([*get_env_bin_dirs(prefix), env.get('PATH', '')])
+    env['CONDA_PREFIX'] = prefix
+    env['CONDA_DEFAULT_ENV'] = env_name
+    env['CONDA_PROMPT_MODIFIER'] = f'({env_name}) '
+    env.pop('PYTHONHOME', None)
+    env.update(get_config_env_vars(prefix))
+
+    activate_dir = osp.join(prefix, 'etc', 'conda', 'activate.d')
+    if os.name == 'nt':
+        if len(glob.glob(osp.join(activate_dir, '*.bat'))) > 0:
+            return None
+        return env
+
+    scripts = sorted(glob.glob(osp.join(activate_dir, '*.sh')))
+    if len(scripts) == 0:
+        return env
+    return run_activate_scripts(scripts, env)
@@ -1,14 +1,25 @@
+import glob
+import hashlib
 import os
 import os.path as osp
 import json
-from rich.console import Console
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+from typing import Any, Callable, Dict, Iterable, Tuple, Union
 from enum import Enum
+from condascan.profiling import profile_stage
+from condascan.records import intern_packages
 
 class CacheType(Enum):
-    PACKAGES = 'conda_env_packages.json'
-    COMMANDS = 'conda_env_commands.json'
-
-console = Console()
+    PACKAGES = 'packages'
+    COMMANDS = 'command_cache.json'
+    LEGACY_COMMANDS = 'conda_env_commands.json'
+    INDEX = 'package_index.sqlite'
+    LEGACY_INDEX = 'package_index.json'
+    SOCKET = 'daemon.sock'
 
 def get_and_create_cache_path(cache_type: CacheType, cache_dir: str = '~/.cache/condascan'):
     cache_dir = osp.expanduser(cache_dir)
@@ -16,15 +27,194 @@ def get_and_create_cache_path(cache_type: CacheType, cache_dir: str = '~/.cache/
     path = osp.join(cache_dir, cache_type.value)
     return path
 
-def write_cache(envs, cache_type: CacheType):
-    with open(get_and_create_cache_path(cache_type), 'w') as f:
-        json.dump(envs, f, indent=4)
+def atomic_write_json(path: str, data):
+    fd, tmp_path = tempfile.mkstemp(dir=osp.dirname(path), prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
-def get_cache(cache_type: CacheType):
+def get_env_fingerprint(prefix: str) -> str:
+    meta_dir = osp.join(prefix, 'conda-meta')
+    parts = []
+    for path in [osp.join(meta_dir, 'history'), *sorted(glob.glob(osp.join(prefix, 'lib', 'python*', 'site-packages'))), osp.join(prefix, 'Lib', 'site-packages')]:
+        try:
+            stat = os.stat(path)
+            parts.append(f'{path}:{stat.st_mtime_ns}:{stat.st_size}')
+        except OSError:
+            parts.append(f'{path}:-')
     try:
-        with open(get_and_create_cache_path(cache_type), 'r') as f:
-            console.print('[bold]Running using cache. If there are changes to your conda environments since the last time you run this command, try running with --no-cache[/bold]')
-            return json.load(f)
-    except Exception as e:
-        console.print('[bold yellow]Cache not found or invalid. Running without cache, this may take a while[/bold yellow]')
-        return {}
\ No newline at end of file
+        parts.extend(sorted(os.listdir(meta_dir)))
+    except OSError:
+        pass
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+# name -> (version, build, channel, source)
+PackageRecords = Dict[str, Tuple[str, str, str, str]]
+
+SHARD_FORMAT = 2
+
+class PackageStore:
+    def __init__(self, use_cache: bool = True):
+        self.root = get_and_create_cache_path(CacheType.PACKAGES)
+        os.makedirs(self.root, exist_ok=True)
+        self.use_cache = use_cache
+        self.shards = {}
+        self.dirty = set()
+
+    def _shard_path(self, env: str) -> str:
+        return osp.join(self.root, quote(env, safe='') + '.json')
+
+    def get(self, env: str, fingerprint: str) -> Union[PackageRecords, None]:
+        # A shard kept in memory may have been updated on disk by `condascan watch`
+        if env not in self.shards or (self.shards[env][0] != fingerprint and env not in self.dirty):
+            if not self.use_cache:
+                return None
+            try:
+                with profile_stage('cache load', env), open(self._shard_path(env), 'r') as f:
+                    shard = json.load(f)
+                if shard.get('format') != SHARD_FORMAT:
+                    return None
+                self.shards[env] = (shard['fingerprint'], intern_packages(shard['packages']))
+            except (OSError, ValueError, KeyError, AttributeError):
+                return None
+        if self.shards[env][0] != fingerprint:
+            return None
+        return self.shards[env][1]
+
+    def set(self, env: str, fingerprint: str, packages: PackageRecords):
+        self.shards[env] = (fingerprint, packages)
+        self.dirty.add(env)
+
+    def prune(self, existing_envs: Iterable[str], in_scope: Callable[[str], bool] = lambda env: True):
+        existing_envs = set(existing_envs)
+        for env in [env for env in self.shards if env not in existing_envs and in_scope(env)]:
+            del self.shards[env]
+            self.dirty.discard(env)
+        for entry in os.listdir(self.root):
+            if not entry.endswith('.json') or entry.startswith('.'):
+                continue
+            env = unquote(entry[:-len('.json')])
+            if env not in existing_envs and in_scope(env):
+                try:
+                    os.remove(osp.join(self.root, entry))
+                except OSError:
+                    pass
+
+    def flush(self):
+        for env in sorted(self.dirty):
+            fingerprint, packages = self.shards[env]
+            with profile_stage('cache write', env):
+                atomic_write_json(self._shard_path(env), {'format': SHARD_FORMAT, 'fingerprint': fingerprint, 'packages': packages})
+        self.dirty.clear()
+
+CommandResult = Tuple[bool, Any]
+
+class CommandCache:
+    def __init__(self, use_cache: bool = True, ttl: Union[float, None] = None, max_entries: int = 10000):
+        self.path = get_and_create_cache_path(CacheType.COMMANDS)
+        self.use_cache = use_cache
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.env_commands = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        try:
+            with profile_stage('cache load'), open(self.path, 'r') as f:
+                cache = json.load(f)
+            for env, command, fingerprint, success, detail, created in cache['entries']:
+                self._add(env, command, (fingerprint, success, detail, created))
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = OrderedDict()
+            self.env_commands = {}
+
+    def _add(self, env: str, command: str, entry: Tuple[str, bool, Any, float]):
+        self.entries[(env, command)] = entry
+        self.entries.move_to_end((env, command))
+        self.env_commands.setdefault(env, set()).add(command)
+
+    def _remove(self, env: str, command: str):
+        del self.entries[(env, command)]
+        self.env_commands[env].discard(command)
+        if len(self.env_commands[env]) == 0:
+            del self.env_commands[env]
+        self.dirty = True
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, env: str, fingerprint: str, command: str) -> Union[CommandResult, None]:
+        if not self.use_cache:
+            return None
+        with self.lock:
+            entry = self.entries.get((env, command))
+            if entry is None:
+                return None
+            if entry[0] != fingerprint:
+                self._invalidate(env)
+                return None
+            if self._is_expired(entry[3], time.time()):
+                self._remove(env, command)
+                return None
+            self.entries.move_to_end((env, command))
+            self.dirty = True
+            return entry[1], entry[2]
+
+    def peek(self, env: str, command: str) -> Union[Tuple[str, bool], None]:
+        # Unlike get, keeps entries of environments that changed since they were computed
+        if not self.use_cache:
+            return None
+        with self.lock:
+            entry = self.entries.get((env, command))
+        if entry is None or self._is_expired(entry[3], time.time()):
+            return None
+        return entry[0], entry[1]
+
+    def set(self, env: str, fingerprint: str, command: str, result: CommandResult):
+        with self.lock:
+            commands = self.env_commands.get(env)
+            if commands and self.entries[(env, next(iter(commands)))][0] != fingerprint:
+                self._invalidate(env)
+            self._add(env, command, (fingerprint, result[0], result[1], time.time()))
+            while len(self.entries) > self.max_entries:
+                self._remove(*next(iter(self.entries)))
+            self.dirty = True
+
+    def _invalidate(self, env: str):
+        for command in list(self.env_commands.get(env, ())):
+            self._remove(env, command)
+
+    def invalidate(self, env: str):
+        with self.lock:
+            self._invalidate(env)
+
+    def prune(self, existing_envs: Iterable[str]):
+        existing_envs = set(existing_envs)
+        with self.lock:
+            for env in [env for env in self.env_commands if env not in existing_envs]:
+                self._invalidate(env)
+
+    def flush(self):
+        with self.lock:
+            now = time.time()
+            for env, command in [key for key, entry in self.entries.items() if self._is_expired(entry[3], now)]:
+                self._remove(env, command)
+            while len(self.entries) > self.max_entries:
+                self._remove(*next(iter(self.entries)))
+            if not self.dirty:
+                return
+            with profile_stage('cache write'):
+                atomic_write_json(self.path, {'entries': [[env, command, *entry] for (env, command), entry in self.entries.items()]})
+            self.dirty = False
+        try:
+            os.remove(get_and_create_cache_path(CacheType.LEGACY_COMMANDS))
+        except OSError:
+            pass
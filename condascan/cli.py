@@ -1,11 +1,25 @@
+import sys
 from condascan.parser import parse_args
-from condascan.task import Task
 
 def main():
     args = parse_args()
-    task = Task.from_args(args)
-    task.initialize_and_verify()
-    task.process()
+    if args.subcommand == 'serve':
+        from condascan.daemon import serve
+        serve()
+        return
+    if args.subcommand == 'watch':
+        from condascan.watch import watch
+        watch(args.debounce, args.interval, args.polling)
+        return
+
+    if not args.no_daemon:
+        from condascan.daemon import run_in_daemon
+        exit_code = run_in_daemon(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    from condascan.task import run_task
+    run_task(args)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -4,6 +4,8 @@ class ReturnCode(Enum):
     EXECUTED = 0
     COMMAND_NOT_FOUND = 1
     UNHANDLED_ERROR = 2
+    TIMEOUT = 3
+    CANCELLED = 4
 
 class PackageCode(Enum):
     FOUND = 0
@@ -11,3 +13,9 @@ class PackageCode(Enum):
     VERSION_MISMATCH = 2
     MISSING = 3
     ERROR = 4
+
+class CommandCode(Enum):
+    SUCCESS = 0
+    FAILED = 1
+    TIMEOUT = 2
+    ERROR = 3
@@ -0,0 +1,50 @@
+import json
+import sys
+import threading
+from typing import IO, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+_console = None
+_output = None
+_error_output = None
+_output_lock = threading.Lock()
+
+def get_console() -> 'Console':
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
+
+def set_console(console: Union['Console', None]):
+    global _console
+    _console = console
+
+def get_output() -> IO:
+    return _output if _output is not None else sys.stdout
+
+def get_error_output() -> IO:
+    return _error_output if _error_output is not None else sys.stderr
+
+def set_outputs(output: Union[IO, None], error_output: Union[IO, None]):
+    global _output, _error_output
+    _output = output
+    _error_output = error_output
+
+def use_error_console():
+    from rich.console import Console
+    set_console(Console(file=get_error_output()))
+
+def write_json(data, indent: Union[int, None] = None):
+    output = get_output()
+    with _output_lock:
+        output.write(json.dumps(data, indent=indent, default=str) + '\n')
+        output.flush()
+
+class LazyConsole:
+    def __getattr__(self, name: str):
+        return getattr(get_console(), name)
+
+console = LazyConsole()
@@ -0,0 +1,177 @@
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from typing import List, Union
+from condascan import __version__
+from condascan.cache import CacheType, get_and_create_cache_path
+from condascan.console import console, get_console, set_console, set_outputs
+
+# The server reads the cache under the home it was started with, clients with another home run in-process
+SERVER_VARIABLES = ('HOME',)
+
+class SocketWriter(io.TextIOBase):
+    def __init__(self, wfile, lock: threading.Lock, stream: str = 'out'):
+        self.wfile = wfile
+        self.lock = lock
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            self.wfile.write((json.dumps({self.stream: text}) + '\n').encode())
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            self.wfile.flush()
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        from rich.console import Console
+        from condascan.parser import parse_args
+        from condascan.task import run_task
+
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        environ = request.get('environ')
+        if request.get('version') != __version__ or not isinstance(environ, dict) or any(environ.get(x) != os.environ.get(x) for x in SERVER_VARIABLES):
+            self.wfile.write((json.dumps({'exit': None}) + '\n').encode())
+            return
+
+        lock = threading.Lock()
+        writer = SocketWriter(self.wfile, lock, 'out')
+        previous_console = get_console()
+        previous_cwd = os.getcwd()
+        previous_environ = dict(os.environ)
+        set_outputs(writer, SocketWriter(self.wfile, lock, 'err'))
+        set_console(Console(file=writer, force_terminal=request.get('terminal', False), width=request.get('width', 80)))
+        exit_code = 0
+        try:
+            # Discovery and the commands of can-execute see the variables of the client
+            os.environ.clear()
+            os.environ.update(environ)
+            os.chdir(request['cwd'])
+            args = parse_args(request['argv'])
+            run_task(args, self.server.state)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            console.print(f'[red]Unhandled error in condascan server: {str(e)}[/red]')
+            exit_code = 1
+        finally:
+            set_console(previous_console)
+            set_outputs(None, None)
+            os.chdir(previous_cwd)
+            os.environ.clear()
+            os.environ.update(previous_environ)
+
+        try:
+            writer.flush()
+            self.wfile.write((json.dumps({'exit': exit_code}) + '\n').encode())
+        except OSError:
+            pass
+
+class DaemonServer(socketserver.UnixStreamServer):
+    def __init__(self, path: str):
+        super().__init__(path, RequestHandler)
+        self.state = {}
+
+    def server_bind(self):
+        # Anyone who can connect can run commands as the owner of the server
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, 0o600)
+
+def get_socket_path() -> str:
+    return get_and_create_cache_path(CacheType.SOCKET)
+
+def is_daemon_running(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+        return True
+    except OSError:
+        return False
+
+def serve():
+    if not hasattr(socket, 'AF_UNIX'):
+        console.print('[red]:x: The condascan server requires Unix domain sockets, which are not available on this platform[/red]')
+        sys.exit(1)
+
+    path = get_socket_path()
+    if os.path.exists(path):
+        if is_daemon_running(path):
+            console.print(f'[red]:x: A condascan server is already listening on "{path}"[/red]')
+            sys.exit(1)
+        os.remove(path)
+
+    import condascan.task
+    server = DaemonServer(path)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    console.print(f'[green]:heavy_check_mark: condascan server listening on "{path}". Press Ctrl+C to stop[/green]')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def run_in_daemon(argv: List[str]) -> Union[int, None]:
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    path = get_socket_path()
+    if not os.path.exists(path):
+        return None
+
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+    except OSError:
+        return None
+
+    started = False
+    with client:
+        stream = client.makefile('rwb')
+        request = {
+            'version': __version__,
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'environ': dict(os.environ),
+            'terminal': sys.stdout.isatty(),
+            'width': shutil.get_terminal_size().columns,
+        }
+        try:
+            stream.write((json.dumps(request) + '\n').encode())
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if 'out' in message:
+                    started = True
+                    sys.stdout.write(message['out'])
+                    sys.stdout.flush()
+                elif 'err' in message:
+                    started = True
+                    sys.stderr.write(message['err'])
+                    sys.stderr.flush()
+                elif 'exit' in message:
+                    return message['exit']
+        except (OSError, ValueError):
+            pass
+    if started:
+        console.print('[red]:x: Lost connection to the condascan server[/red]')
+        return 1
+    return None
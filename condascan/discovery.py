@@ -0,0 +1,93 @@
+import os
+import os.path as osp
+import shutil
+from typing import Dict, List, Union
+
+def is_conda_prefix(prefix: str) -> bool:
+    return osp.isdir(osp.join(prefix, 'conda-meta'))
+
+def get_conda_root() -> Union[str, None]:
+    candidates = [os.environ.get('CONDA_ROOT')]
+    for exe in (os.environ.get('CONDA_EXE'), shutil.which('conda')):
+        if exe:
+            exe_dir = osp.dirname(osp.realpath(exe))
+            candidates.append(osp.dirname(exe_dir))
+    candidates.append(os.environ.get('CONDA_PREFIX_1'))
+    candidates.append(os.environ.get('CONDA_PREFIX'))
+
+    for candidate in candidates:
+        if candidate and is_conda_prefix(candidate) and osp.isdir(osp.join(candidate, 'condabin')):
+            return osp.normpath(candidate)
+    return None
+
+def get_condarc_envs_dirs(root: str) -> List[str]:
+    paths = [
+        osp.join(root, '.condarc'),
+        osp.join(root, 'condarc'),
+        osp.expanduser('~/.config/conda/.condarc'),
+        osp.expanduser('~/.config/conda/condarc'),
+        osp.expanduser('~/.conda/.condarc'),
+        osp.expanduser('~/.conda/condarc'),
+        osp.expanduser('~/.condarc'),
+    ]
+    if os.environ.get('CONDARC'):
+        paths.append(os.environ['CONDARC'])
+
+    envs_dirs = []
+    for path in paths:
+        if not osp.isfile(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                content = f.read()
+        except OSError:
+            continue
+        if 'envs_dirs' not in content:
+            continue
+
+        import yaml
+        try:
+            config = yaml.safe_load(content) or {}
+        except yaml.YAMLError:
+            continue
+        if isinstance(config, dict):
+            envs_dirs.extend(x for x in config.get('envs_dirs', None) or [] if isinstance(x, str))
+    return envs_dirs
+
+def get_envs_dirs(root: str) -> List[str]:
+    envs_dirs = []
+    for var in ('CONDA_ENVS_PATH', 'CONDA_ENVS_DIRS'):
+        envs_dirs.extend(x for x in os.environ.get(var, '').split(os.pathsep) if x != '')
+    envs_dirs.extend(get_condarc_envs_dirs(root))
+    envs_dirs.extend([osp.join(root, 'envs'), osp.join('~', '.conda', 'envs')])
+    return list(dict.fromkeys(osp.normpath(osp.expandvars(osp.expanduser(x))) for x in envs_dirs))
+
+def read_environments_txt() -> List[str]:
+    try:
+        with open(osp.expanduser(osp.join('~', '.conda', 'environments.txt')), 'r') as f:
+            return [x.strip() for x in f.readlines() if x.strip() != '' and not x.startswith('#')]
+    except OSError:
+        return []
+
+def discover_conda_envs() -> Union[Dict[str, str], None]:
+    root = get_conda_root()
+    if root is None:
+        return None
+
+    envs_dirs = get_envs_dirs(root)
+    prefixes = read_environments_txt()
+    for envs_dir in envs_dirs:
+        try:
+            prefixes.extend(osp.join(envs_dir, x) for x in sorted(os.listdir(envs_dir)))
+        except OSError:
+            continue
+
+    envs = {'base': root}
+    seen = {osp.realpath(root)}
+    for prefix in sorted(osp.normpath(x) for x in prefixes):
+        if osp.realpath(prefix) in seen or not is_conda_prefix(prefix):
+            continue
+        seen.add(osp.realpath(prefix))
+        name = osp.basename(prefix) if osp.dirname(prefix) in envs_dirs else prefix
+        envs[name if name not in envs else prefix] = prefix
+    return envs
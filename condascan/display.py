@@ -1,25 +1,43 @@
-from rich import box
-from rich.console import Console
-from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn, SpinnerColumn
-from rich.table import Table
-from typing import List, Tuple, Dict, Union
-from condascan.codes import PackageCode
+from typing import TYPE_CHECKING, List, Tuple, Dict, Union
+from condascan.codes import PackageCode, CommandCode
+from condascan.console import console, get_console, write_json
+from condascan.probe import format_probe_result
 
-console = Console()
+if TYPE_CHECKING:
+    from rich.progress import Progress
+    from condascan.matrix import IncidenceMatrix
+    from condascan.profiling import Profiler
+    from condascan.records import EnvMatch, RequirementResult
 
-def get_progress_bar(console: Console) -> Progress:
+def get_progress_bar() -> 'Progress':
+    from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn, SpinnerColumn
     return Progress(
         SpinnerColumn(),
         TextColumn('[bold blue]{task.description}'),
         BarColumn(),
         '[progress.percentage]{task.percentage:>3.0f}%',
         TimeRemainingColumn(),
-        console=console,
+        console=get_console(),
         transient=True,
     )
 
-def display_have_output(filtered_envs: Tuple, limit: int = -1, verbose: bool = False, first: bool = False):
+def get_package_info(requirements: List['RequirementResult'], show_found: bool = True) -> List[str]:
+    info = []
+    for x in requirements:
+        if x.code == PackageCode.MISSING:
+            info.append(f'[red]:x: {x.name}: missing[/red]')
+        elif x.code == PackageCode.VERSION_INVALID or x.code == PackageCode.VERSION_MISMATCH:
+            info.append(f'[yellow]:warning: {x.name}: {x.detail}[/yellow]')
+        elif x.code == PackageCode.FOUND and show_found:
+            info.append(f'[green]:heavy_check_mark: {x.name}=={x.detail}[/green]')
+        elif x.code == PackageCode.ERROR:
+            info.append(f'[red]:exclamation: {x.name}: {x.detail}[/red]')
+    return info
+
+def display_have_output(filtered_envs: List['EnvMatch'], limit: int = -1, verbose: bool = False, first: bool = False):
     if verbose:
+        from rich import box
+        from rich.table import Table
         table = Table(title='Results', title_style='bold', box=box.MINIMAL_HEAVY_HEAD, show_lines=True)
         table.add_column('Environment', style='cyan', justify='left')
         table.add_column('Python Version', style='blue', justify='left')
@@ -30,21 +48,11 @@ def display_have_output(filtered_envs: Tuple, limit: int = -1, verbose: bool = F
             console.print(f'\n[bold]Limiting output to {limit} environments[/bold]')
             filtered_envs = filtered_envs[:limit]
         for env in filtered_envs:
-            info = []
-            for package, (status, detail) in env[2]:
-                if status == PackageCode.MISSING:
-                    info.append(f'[red]:x: {package}: missing[/red]')
-                elif status == PackageCode.VERSION_INVALID or status == PackageCode.VERSION_MISMATCH:
-                    info.append(f'[yellow]:warning: {package}: {detail}[/yellow]')
-                elif status == PackageCode.FOUND:
-                    info.append(f'[green]:heavy_check_mark: {package}=={detail}[/green]')
-                elif status == PackageCode.ERROR:
-                    info.append(f'[red]:exclamation: {package}: {detail}[/red]')
-            table.add_row(env[0], str(env[3]), str(env[1][3]), '\n'.join(info))
+            table.add_row(env.env, '-' if env.error else str(env.python_version), '-' if env.error else str(env.n_packages), '\n'.join(get_package_info(env.requirements)))
         console.print()
         console.print(table)
     else:
-        filtered_envs = [x for x in filtered_envs if x[-1]]
+        filtered_envs = [x for x in filtered_envs if x.ok]
         if len(filtered_envs) == 0:
             console.print('\n[red]No environments found with all required packages. To see the details, run with --verbose[/red]')
         else:
@@ -59,14 +67,48 @@ def display_have_output(filtered_envs: Tuple, limit: int = -1, verbose: bool = F
             
             console.print(text)
             for env in filtered_envs:
-                console.print(f'[green] • {env[0]}[/green]')
+                console.print(f'[green] • {env.env}[/green]')
 
-def display_can_exec_output(filtered_envs: List, limit: int = -1, verbose: bool = False, first: bool = False):
+def display_batch_output(batch_results: List[Tuple[str, List, List['EnvMatch']]], verbose: bool = False):
+    from rich import box
+    from rich.table import Table
+
+    table = Table(title='Best Environment per Requirement File', title_style='bold', box=box.MINIMAL_HEAVY_HEAD, show_lines=verbose)
+    table.add_column('Requirements', style='cyan', justify='left')
+    table.add_column('Best Environment', justify='left')
+    table.add_column('Satisfied', style='magenta', justify='right')
+    table.add_column('Matching Environments', style='blue', justify='right')
     if verbose:
+        table.add_column('Info', justify='left')
+
+    n_satisfied = 0
+    for file, requirements, ranked in batch_results:
+        matching = [x for x in ranked if x.ok]
+        n_satisfied += len(matching) > 0
+        if len(ranked) == 0 or ranked[0].error:
+            row = [file, '[red]-[/red]', f'0/{len(requirements)}', str(len(matching))]
+            info = get_package_info(ranked[0].requirements) if len(ranked) > 0 else []
+        else:
+            best = ranked[0]
+            color = 'green' if best.ok else 'yellow'
+            row = [file, f'[{color}]{best.env}[/{color}]', f'{best.found}/{len(requirements)}', str(len(matching))]
+            info = get_package_info(best.requirements, show_found=False)
+        if verbose:
+            row.append('\n'.join(info))
+        table.add_row(*row)
+
+    console.print()
+    console.print(table)
+    console.print(f'[bold]{n_satisfied} of {len(batch_results)} requirement files are satisfied by at least one environment[/bold]')
+
+def display_can_exec_output(filtered_envs: List, limit: int = -1, verbose: bool = False, first: bool = False, action: str = 'execute the command'):
+    if verbose:
+        from rich import box
+        from rich.table import Table
         table = Table(title='Results', title_style='bold', box=box.MINIMAL_HEAVY_HEAD)
         table.add_column('Environment', style='cyan', justify='left')
         table.add_column('Python Version', style='blue', justify='left')
-        table.add_column('Command', style='magenta', justify='left')
+        table.add_column('Module' if action == 'import the modules' else 'Command', style='magenta', justify='left')
         table.add_column('Result', justify='left')
 
         if limit != -1:
@@ -74,9 +116,16 @@ def display_can_exec_output(filtered_envs: List, limit: int = -1, verbose: bool
             filtered_envs = filtered_envs[:limit]
         for env in filtered_envs:
             first = True
-            for command, (success, detail) in env[1]:
-                if success:
+            for command, (status, detail) in env[1]:
+                # can-import keeps the structured result of the probe
+                if isinstance(detail, dict):
+                    detail = format_probe_result(detail)
+                if status == CommandCode.SUCCESS:
                     detail = f'[green]:heavy_check_mark: {detail}[/green]'
+                elif status == CommandCode.TIMEOUT:
+                    detail = f'[yellow]:hourglass: {detail}[/yellow]'
+                elif status == CommandCode.ERROR:
+                    detail = f'[red]:exclamation: {detail}[/red]'
                 else:
                     detail = f'[red]:x: {detail}[/red]'
                 if first:
@@ -91,15 +140,15 @@ def display_can_exec_output(filtered_envs: List, limit: int = -1, verbose: bool
     else:
         filtered_envs = [x for x in filtered_envs if x[-1]]
         if len(filtered_envs) == 0:
-            console.print('\n[red]No environments found that can execute the command. To see the details, run with --verbose[/red]')
+            console.print(f'\n[red]No environments found that can {action}. To see the details, run with --verbose[/red]')
         else:
             if first:
-                text = '\n[bold]Found the first environment that can execute the command:[/bold]'
+                text = f'\n[bold]Found the first environment that can {action}:[/bold]'
             else:
                 if limit == -1:
-                    text = f'\n[bold]Found {len(filtered_envs)} environments that can execute the command:[/bold]'
+                    text = f'\n[bold]Found {len(filtered_envs)} environments that can {action}:[/bold]'
                 else:
-                    text = f'\n[bold]Found {len(filtered_envs)} environments that can execute the command (output limited to {limit}):[/bold]'
+                    text = f'\n[bold]Found {len(filtered_envs)} environments that can {action} (output limited to {limit}):[/bold]'
                     filtered_envs = filtered_envs[:limit]
             
             console.print(text)
@@ -107,6 +156,9 @@ def display_can_exec_output(filtered_envs: List, limit: int = -1, verbose: bool
                 console.print(f'[green] • {env[0]}[/green]')
 
 def display_compare_output(common_packages: List[str], distinct_packages: Dict[str, List[str]], packages_version: Dict[str, Dict[str, str]]):
+    from rich import box
+    from rich.table import Table
+
     if len(common_packages) > 0:
         common_table = Table(title='Common Packages', title_style='bold', box=box.MINIMAL_HEAVY_HEAD)
         common_table.add_column('Package', style='cyan', justify='left')
@@ -133,4 +185,151 @@ def display_compare_output(common_packages: List[str], distinct_packages: Dict[s
             console.print()
             console.print(distinct_table)
         else:
-            console.print(f'[bold]\nNo distinct package in {env}[/bold]')
\ No newline at end of file
+            console.print(f'[bold]\nNo distinct package in {env}[/bold]')
+
+def display_matrix_output(matrix: 'IncidenceMatrix', similarity: List[List[float]], near_duplicates: List[Tuple[str, str, float, int, int]], threshold: float):
+    from rich import box
+    from rich.table import Table
+
+    distinct_packages = matrix.distinct()
+    env_table = Table(title='Environments', title_style='bold', box=box.MINIMAL_HEAVY_HEAD)
+    env_table.add_column('Environment', style='cyan', justify='left')
+    env_table.add_column('Packages', style='magenta', justify='right')
+    env_table.add_column('Distinct', style='magenta', justify='right')
+    env_table.add_column('Most Similar', style='blue', justify='left')
+    env_table.add_column('Similarity', style='blue', justify='right')
+    for i, env in enumerate(matrix.envs):
+        j = max((j for j in range(len(matrix.envs)) if j != i), key=lambda j: similarity[i][j])
+        env_table.add_row(env, str(len(matrix.packages_version[env])), str(len(distinct_packages[env])), matrix.envs[j], f'{similarity[i][j]:.2f}')
+    console.print()
+    console.print(env_table)
+    console.print(f'[bold]{len(matrix.common())} of {len(matrix.packages)} packages are installed in every environment[/bold]')
+
+    divergent = matrix.divergent()
+    if len(divergent) > 0:
+        divergent_table = Table(title='Packages with Diverging Versions', title_style='bold', box=box.MINIMAL_HEAVY_HEAD)
+        divergent_table.add_column('Package', style='cyan', justify='left')
+        divergent_table.add_column('Environments', style='magenta', justify='right')
+        divergent_table.add_column('Versions', style='blue', justify='left')
+        for package, versions in sorted(divergent.items(), key=lambda x: (-len(set(x[1].values())), x[0])):
+            divergent_table.add_row(package, str(len(versions)), ', '.join(sorted(set(versions.values()))))
+        console.print()
+        console.print(divergent_table)
+    else:
+        console.print('[bold]\nNo package has diverging versions between environments[/bold]')
+
+    if len(near_duplicates) > 0:
+        duplicate_table = Table(title=f'Near-duplicate Environments (similarity >= {threshold:.2f})', title_style='bold', box=box.MINIMAL_HEAVY_HEAD)
+        duplicate_table.add_column('Environment', style='cyan', justify='left')
+        duplicate_table.add_column('Environment', style='cyan', justify='left')
+        duplicate_table.add_column('Similarity', style='blue', justify='right')
+        duplicate_table.add_column('Shared Packages', style='magenta', justify='right')
+        duplicate_table.add_column('Version Differences', style='magenta', justify='right')
+        for env_a, env_b, score, shared, differences in near_duplicates:
+            duplicate_table.add_row(env_a, env_b, f'{score:.2f}', str(shared), str(differences))
+        console.print()
+        console.print(duplicate_table)
+    else:
+        console.print(f'[bold]\nNo pair of environments has a similarity of at least {threshold:.2f}[/bold]')
+
+def get_have_record(env: 'EnvMatch') -> Dict:
+    return {
+        'env': env.env,
+        'ok': env.ok,
+        'python_version': str(env.python_version),
+        'packages_installed': env.n_packages,
+        'found': env.found,
+        'invalid': env.invalid,
+        'mismatch': env.mismatch,
+        'requirements': [{'name': x.name, 'status': x.code.name.lower(), 'detail': str(x.detail)} for x in env.requirements],
+    }
+
+def get_can_exec_record(env: Tuple) -> Dict:
+    return {
+        'env': env[0],
+        'ok': env[-1],
+        'python_version': env[2],
+        'results': [{'name': command, 'status': status.name.lower(), 'detail': detail} for command, (status, detail) in env[1]],
+    }
+
+def get_can_import_record(env: Tuple) -> Dict:
+    results = []
+    for module, (status, detail) in env[1]:
+        if isinstance(detail, dict):
+            results.append({'name': module, 'status': status.name.lower(), 'version': detail['version'], 'time': detail['time'], 'error': detail['error']})
+        else:
+            results.append({'name': module, 'status': status.name.lower(), 'version': None, 'time': None, 'error': detail})
+    return {
+        'env': env[0],
+        'ok': env[-1],
+        'python_version': env[2],
+        'results': results,
+    }
+
+def display_json_output(records: List[Dict], limit: int = -1):
+    if limit != -1:
+        records = records[:limit]
+    write_json(records, indent=4)
+
+def display_compare_json_output(common_packages: List[str], distinct_packages: Dict[str, List[str]], packages_version: Dict[str, Dict[str, str]], ndjson: bool = False):
+    summary = {
+        'common': {package: {env: packages_version[env][package] for env in distinct_packages.keys()} for package in common_packages},
+        'distinct': {env: {package: packages_version[env][package] for package in packages} for env, packages in distinct_packages.items()},
+    }
+    write_json(summary, indent=None if ndjson else 4)
+
+def display_matrix_json_output(matrix: 'IncidenceMatrix', similarity: List[List[float]], near_duplicates: List[Tuple[str, str, float, int, int]], ndjson: bool = False):
+    distinct_packages = matrix.distinct()
+    summary = {
+        'envs': {env: {'packages': len(matrix.packages_version[env]), 'distinct': distinct_packages[env]} for env in matrix.envs},
+        'common': matrix.common(),
+        'divergent': matrix.divergent(),
+        'similarity': {'envs': matrix.envs, 'jaccard': [[round(x, 4) for x in row] for row in similarity]},
+        'near_duplicates': [{'envs': [env_a, env_b], 'similarity': round(score, 4), 'shared': shared, 'version_differences': differences} for env_a, env_b, score, shared, differences in near_duplicates],
+    }
+    write_json(summary, indent=None if ndjson else 4)
+
+def display_profile_output(profiler: 'Profiler'):
+    from rich import box
+    from rich.table import Table
+
+    stage_table = Table(title=f'Profile ({profiler.get_wall_time() * 1000:.1f} ms wall time)', title_style='bold', box=box.MINIMAL_HEAVY_HEAD)
+    stage_table.add_column('Stage', style='cyan', justify='left')
+    stage_table.add_column('Calls', style='magenta', justify='right')
+    stage_table.add_column('Total (ms)', style='blue', justify='right')
+    stage_table.add_column('Mean (ms)', style='blue', justify='right')
+    stage_table.add_column('Max (ms)', style='blue', justify='right')
+    for stage, (calls, total, slowest) in sorted(profiler.get_stage_totals().items(), key=lambda x: -x[1][1]):
+        stage_table.add_row(stage, str(calls), f'{total * 1000:.1f}', f'{total / calls * 1000:.1f}', f'{slowest * 1000:.1f}')
+    console.print()
+    console.print(stage_table)
+    console.print('[bold]Times of stages that run in parallel are summed over the worker threads[/bold]')
+
+    slowest_envs = profiler.get_slowest('scan env')
+    if len(slowest_envs) > 0:
+        env_table = Table(title='Slowest Environments', title_style='bold', box=box.MINIMAL_HEAVY_HEAD)
+        env_table.add_column('Environment', style='cyan', justify='left')
+        env_table.add_column('Time (ms)', style='blue', justify='right')
+        for env, duration in slowest_envs:
+            env_table.add_row(env, f'{duration * 1000:.1f}')
+        console.print()
+        console.print(env_table)
+
+    console.print()
+    for counter, label in (('subprocesses', 'Subprocesses spawned'), ('package cache hits', 'Package cache hits'), ('package cache misses', 'Package cache misses')):
+        console.print(f'[bold]{label}:[/bold] {profiler.counters.get(counter, 0)}')
+
+def display_batch_json_output(batch_results: List[Tuple[str, List, List['EnvMatch']]], ndjson: bool = False):
+    records = []
+    for file, _, ranked in batch_results:
+        records.append({
+            'requirements': file,
+            'ok': len(ranked) > 0 and ranked[0].ok,
+            'best': get_have_record(ranked[0]) if len(ranked) > 0 else None,
+            'matching': [x.env for x in ranked if x.ok],
+        })
+    if ndjson:
+        for record in records:
+            write_json(record)
+    else:
+        write_json(records, indent=4)
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, Tuple
+from condascan.cache import CacheType, PackageRecords, get_and_create_cache_path
+from condascan.profiling import profile_stage
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS envs (env TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, n_packages INTEGER NOT NULL, python_version TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS postings (name TEXT NOT NULL, env TEXT NOT NULL, version TEXT NOT NULL, PRIMARY KEY (name, env)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_env ON postings (env);
+'''
+# Stays below the limit of query parameters of old SQLite versions
+MAX_LOOKUP_NAMES = 500
+
+class PackageIndex:
+    def __init__(self, use_cache: bool = True):
+        self.path = get_and_create_cache_path(CacheType.INDEX)
+        self.use_cache = use_cache
+        self.envs = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        with profile_stage('index load'):
+            try:
+                self.connection = self._connect()
+            except sqlite3.DatabaseError:
+                # A corrupted index is rebuilt from the package cache
+                os.remove(self.path)
+                self.connection = self._connect()
+            self.reload()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        except sqlite3.DatabaseError:
+            connection.close()
+            raise
+        return connection
+
+    def reload(self):
+        # Only the small table of environments is read, postings are read per requested name
+        with self.lock:
+            if not self.use_cache:
+                self.envs = {}
+                return
+            rows = self.connection.execute('SELECT env, fingerprint, n_packages, python_version FROM envs').fetchall()
+            self.envs = {env: (fingerprint, n_packages, python_version) for env, fingerprint, n_packages, python_version in rows}
+
+    def is_fresh(self, env: str, fingerprint: str) -> bool:
+        return env in self.envs and self.envs[env][0] == fingerprint
+
+    def get_env_info(self, env: str) -> Tuple[int, str]:
+        _, n_packages, python_version = self.envs[env]
+        return n_packages, python_version
+
+    def lookup(self, env: str, names: Iterable[str]) -> Dict[str, str]:
+        names = list(names)
+        result = {}
+        with self.lock:
+            for i in range(0, len(names), MAX_LOOKUP_NAMES):
+                chunk = names[i:i + MAX_LOOKUP_NAMES]
+                result.update(self.connection.execute(f'SELECT name, version FROM postings WHERE env = ? AND name IN ({", ".join("?" * len(chunk))})', (env, *chunk)))
+        return result
+
+    def _remove_env(self, env: str):
+        self.connection.execute('DELETE FROM postings WHERE env = ?', (env,))
+        self.connection.execute('DELETE FROM envs WHERE env = ?', (env,))
+        self.envs.pop(env, None)
+
+    def update_env(self, env: str, fingerprint: str, packages: PackageRecords):
+        python_version = packages['python'][0] if 'python' in packages else 'Not Available'
+        with self.lock:
+            self._remove_env(env)
+            self.connection.execute('INSERT INTO envs VALUES (?, ?, ?, ?)', (env, fingerprint, len(packages), python_version))
+            self.connection.executemany('INSERT INTO postings VALUES (?, ?, ?)', [(name, env, record[0]) for name, record in packages.items()])
+            self.envs[env] = (fingerprint, len(packages), python_version)
+            self.dirty = True
+
+    def prune(self, existing_envs: Iterable[str], in_scope: Callable[[str], bool] = lambda env: True):
+        existing_envs = set(existing_envs)
+        with self.lock:
+            indexed = [row[0] for row in self.connection.execute('SELECT env FROM envs')]
+            for env in [env for env in indexed if env not in existing_envs and in_scope(env)]:
+                self._remove_env(env)
+                self.dirty = True
+
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                with profile_stage('index write'):
+                    self.connection.commit()
+                self.dirty = False
+        try:
+            os.remove(get_and_create_cache_path(CacheType.LEGACY_INDEX))
+        except OSError:
+            pass
@@ -0,0 +1,139 @@
+import glob
+import json
+import os
+import os.path as osp
+import re
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+from condascan.parser import standarize_package_name
+from condascan.records import intern_record
+
+DEFAULT_CHANNELS = {'pkgs/main', 'pkgs/r', 'pkgs/msys2', 'pkgs/free', 'defaults'}
+SUBDIR_PATTERN = re.compile(r'^(noarch|(linux|osx|win|zos|freebsd|emscripten|wasi)-[a-z0-9_]+)$')
+
+def get_channel_name(channel: str) -> str:
+    channel = channel.rstrip('/')
+    if '://' in channel:
+        channel = channel.split('://', 1)[1]
+        channel = channel.split('/', 1)[1] if '/' in channel else ''
+    parts = channel.split('/')
+    if len(parts) > 1 and SUBDIR_PATTERN.match(parts[-1]):
+        parts = parts[:-1]
+    channel = '/'.join(parts)
+    if channel in DEFAULT_CHANNELS:
+        return ''
+    return channel
+
+Record = Tuple[str, str, str, str, str]
+
+def parse_conda_list(lines: List[str]) -> List[Record]:
+    records = []
+    for line in lines:
+        if line == '' or line.startswith('#'):
+            continue
+        line = [x for x in line.split(' ') if x != '']
+        if len(line) < 2:
+            continue
+        records.append((line[0], line[1], line[2] if len(line) > 2 else '', line[3] if len(line) > 3 else '', 'conda-list'))
+    return records
+
+def build_package_records(records: List[Record]) -> Dict[str, Tuple[str, str, str, str]]:
+    return {sys.intern(standarize_package_name(name)): intern_record((version, build, channel, source)) for name, version, build, channel, source in records}
+
+def get_site_packages_dirs(prefix: str) -> List[str]:
+    if os.name == 'nt':
+        dirs = [osp.join(prefix, 'Lib', 'site-packages')]
+    else:
+        dirs = glob.glob(osp.join(prefix, 'lib', 'python*', 'site-packages'))
+    return [x for x in dirs if osp.isdir(x)]
+
+def get_metadata_path(file: str) -> Optional[str]:
+    for suffix in ('.dist-info', '.egg-info'):
+        if f'{suffix}/' in file:
+            return file.split(f'{suffix}/', 1)[0] + suffix
+        if file.endswith(suffix):
+            return file
+    return None
+
+def read_metadata_headers(path: str) -> Tuple[Optional[str], Optional[str]]:
+    name, version = None, None
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                # The headers end at the first blank line, the description follows
+                if line.strip() == '':
+                    break
+                key, sep, value = line.partition(':')
+                key = key.strip().lower()
+                if sep == '':
+                    continue
+                if key == 'name' and name is None:
+                    name = value.strip()
+                elif key == 'version' and version is None:
+                    version = value.strip()
+                if name is not None and version is not None:
+                    break
+    except OSError:
+        pass
+    return name, version
+
+def read_pip_packages(prefix: str, conda_owned: Set[str], conda_names: Set[str]) -> List[Record]:
+    records = []
+    seen = set(conda_names)
+    for site_packages in get_site_packages_dirs(prefix):
+        for entry in sorted(os.listdir(site_packages)):
+            path = osp.join(site_packages, entry)
+            if entry.endswith('.dist-info'):
+                source = 'dist-info'
+                metadata = osp.join(path, 'METADATA')
+                fallback_name, _, fallback_version = entry[:-len('.dist-info')].rpartition('-')
+            elif entry.endswith('.egg-info'):
+                source = 'egg-info'
+                metadata = osp.join(path, 'PKG-INFO') if osp.isdir(path) else path
+                fallback_name, _, fallback_version = entry[:-len('.egg-info')].partition('-')
+                fallback_version = fallback_version.split('-', 1)[0]
+            else:
+                continue
+            if osp.relpath(path, prefix).replace('\\', '/') in conda_owned:
+                continue
+
+            name, version = read_metadata_headers(metadata)
+            name = name or fallback_name
+            version = version or fallback_version
+            if name == '' or version == '' or standarize_package_name(name) in seen:
+                continue
+            seen.add(standarize_package_name(name))
+            records.append((name, version, 'pypi_0', 'pypi', source))
+    return records
+
+def get_conda_package_count(prefix: str) -> Optional[int]:
+    try:
+        return sum(1 for x in os.listdir(osp.join(prefix, 'conda-meta')) if x.endswith('.json'))
+    except OSError:
+        return None
+
+def read_conda_meta(prefix: str) -> Optional[List[Record]]:
+    meta_dir = osp.join(prefix, 'conda-meta')
+    try:
+        entries = sorted(x for x in os.listdir(meta_dir) if x.endswith('.json'))
+    except OSError:
+        return None
+
+    records = []
+    conda_owned = set()
+    conda_names = set()
+    try:
+        for entry in entries:
+            with open(osp.join(meta_dir, entry), 'r') as f:
+                record = json.load(f)
+            name = record['name']
+            records.append((name, record['version'], record.get('build', ''), get_channel_name(record.get('channel', '')), 'conda-meta'))
+            conda_names.add(standarize_package_name(name))
+            for file in record.get('files', []):
+                metadata_path = get_metadata_path(file)
+                if metadata_path is not None:
+                    conda_owned.add(metadata_path)
+        records.extend(read_pip_packages(prefix, conda_owned, conda_names))
+    except (OSError, ValueError, KeyError):
+        return None
+    return records
@@ -0,0 +1,82 @@
+from typing import Dict, List, Tuple
+
+if hasattr(int, 'bit_count'):
+    def popcount(x: int) -> int:
+        return x.bit_count()
+else:
+    def popcount(x: int) -> int:
+        return bin(x).count('1')
+
+def iter_bits(x: int):
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+class IncidenceMatrix:
+    def __init__(self, packages_version: Dict[str, Dict[str, str]]):
+        self.envs = list(packages_version.keys())
+        self.packages_version = packages_version
+        self.packages = sorted(set().union(*(x.keys() for x in packages_version.values())))
+        package_ids = {package: i for i, package in enumerate(self.packages)}
+
+        self.env_packages = [0] * len(self.envs)
+        self.package_envs = [0] * len(self.packages)
+        for i, env in enumerate(self.envs):
+            bits = 0
+            for package in packages_version[env]:
+                package_id = package_ids[package]
+                bits |= 1 << package_id
+                self.package_envs[package_id] |= 1 << i
+            self.env_packages[i] = bits
+
+    def common(self) -> List[str]:
+        all_envs = (1 << len(self.envs)) - 1
+        return [package for package, envs in zip(self.packages, self.package_envs) if envs == all_envs]
+
+    def distinct(self) -> Dict[str, List[str]]:
+        distinct = {env: [] for env in self.envs}
+        for package, envs in zip(self.packages, self.package_envs):
+            if popcount(envs) == 1:
+                distinct[self.envs[envs.bit_length() - 1]].append(package)
+        return distinct
+
+    def divergent(self) -> Dict[str, Dict[str, str]]:
+        divergent = {}
+        for package, envs in zip(self.packages, self.package_envs):
+            if popcount(envs) < 2:
+                continue
+            versions = {self.envs[i]: self.packages_version[self.envs[i]][package] for i in iter_bits(envs)}
+            if len(set(versions.values())) > 1:
+                divergent[package] = versions
+        return divergent
+
+    def jaccard(self, a: int, b: int) -> float:
+        union = popcount(self.env_packages[a] | self.env_packages[b])
+        if union == 0:
+            return 1.0
+        return popcount(self.env_packages[a] & self.env_packages[b]) / union
+
+    def jaccard_matrix(self) -> List[List[float]]:
+        n = len(self.envs)
+        matrix = [[1.0] * n for _ in range(n)]
+        for a in range(n):
+            for b in range(a + 1, n):
+                matrix[a][b] = matrix[b][a] = self.jaccard(a, b)
+        return matrix
+
+    def version_differences(self, a: int, b: int) -> int:
+        versions_a = self.packages_version[self.envs[a]]
+        versions_b = self.packages_version[self.envs[b]]
+        shared = self.env_packages[a] & self.env_packages[b]
+        return sum(1 for i in iter_bits(shared) if versions_a[self.packages[i]] != versions_b[self.packages[i]])
+
+    def near_duplicates(self, matrix: List[List[float]], threshold: float) -> List[Tuple[str, str, float, int, int]]:
+        pairs = []
+        for a in range(len(self.envs)):
+            for b in range(a + 1, len(self.envs)):
+                if matrix[a][b] >= threshold:
+                    shared = popcount(self.env_packages[a] & self.env_packages[b])
+                    pairs.append((self.envs[a], self.envs[b], matrix[a][b], shared, self.version_differences(a, b)))
+        pairs.sort(key=lambda x: (-x[2], x[4], x[0], x[1]))
+        return pairs
@@ -1,22 +1,28 @@
 import argparse
+import os
 import os.path as osp
 import sys
-import yaml
-from packaging.requirements import Requirement, InvalidRequirement
-from rich.console import Console
+from typing import List, Tuple, Union
+from condascan.console import console
+from condascan.profiling import profiled
 
-console = Console()
-
-def parse_args():
+def parse_args(argv: Union[List[str], None] = None):
     parser = argparse.ArgumentParser(prog='condascan', description='condascan: a tool to find conda environments which contain specified package(s)')
     subparsers = parser.add_subparsers(dest='subcommand', required=True)
 
     subparser_have = subparsers.add_parser('have', description='find conda environments that have the specified package(s)', help='find conda environments that have the specified package(s)')
-    subparser_have.add_argument('packages', type=str, help='package(s) to search for in conda environments')
+    subparser_have.add_argument('packages', type=str, nargs='?', help='package(s) to search for in conda environments. Can be omitted when --batch is used', default=None)
+    subparser_have.add_argument('--batch', type=str, nargs='+', help='requirement files (.txt, .yml or .yaml), or directories containing them, to check in a single scan. Reports the best environment for each file', default=None)
     subparser_have.add_argument('--no-cache', action='store_true', help='force to run without using cached results from previous runs')
     subparser_have.add_argument('--first', action='store_true', help='immediately return the first environment that satisfies the requirements. By default, perform a full search over all conda environments')
     subparser_have.add_argument('--limit', type=int, help='limit the number of environments displayed in the output. Use in conjunction with verbose', default=-1)
     subparser_have.add_argument('--verbose', action='store_true', help='enable verbose output')
+    subparser_have.add_argument('--format', type=str, choices=['table', 'json', 'ndjson'], help='output format. "json" prints a single JSON document once the scan finishes, "ndjson" prints one JSON object per environment as soon as it is checked. Both print progress messages to stderr', default='table')
+    subparser_have.add_argument('--no-daemon', action='store_true', help='always run in this process, even if a condascan server is running')
+    subparser_have.add_argument('--profile', action='store_true', help='print how long each stage and environment took and how many subprocesses were spawned')
+    subparser_have.add_argument('--profile-output', type=str, help='also save the timings as a Chrome trace JSON file to this path. Implies --profile', default=None)
+    subparser_have.add_argument('--jobs', type=int, help='number of environments to scan concurrently. By default, use a worker count based on the number of CPUs', default=None)
+    subparser_have.add_argument('--snapshots', type=str, help='query the environment snapshots in this directory instead of the local conda installation. Snapshots are the outputs of "conda list" or "conda list --json", "conda env export" files or copies of environment folders with their conda-meta folder, and are named "<node>:<env>" after the folder they are in and their file name', default=None)
 
     subparser_exe = subparsers.add_parser('can-execute', description='find conda environments that can execute the specified command', help='find conda environments that can execute the specified command')
     subparser_exe.add_argument('commands', type=str, help='command(s) to execute')
@@ -24,21 +30,85 @@ def parse_args():
     subparser_exe.add_argument('--first', action='store_true', help='immediately return the first environment that satisfies the requirements. By default, perform a full search over all conda environments')
     subparser_exe.add_argument('--limit', type=int, help='limit the number of environments displayed in the output. Use in conjunction with verbose', default=-1)
     subparser_exe.add_argument('--verbose', action='store_true', help='enable verbose output')
+    subparser_exe.add_argument('--format', type=str, choices=['table', 'json', 'ndjson'], help='output format. "json" prints a single JSON document once the scan finishes, "ndjson" prints one JSON object per environment as soon as it is checked. Both print progress messages to stderr', default='table')
+    subparser_exe.add_argument('--no-daemon', action='store_true', help='always run in this process, even if a condascan server is running')
+    subparser_exe.add_argument('--profile', action='store_true', help='print how long each stage and environment took and how many subprocesses were spawned')
+    subparser_exe.add_argument('--profile-output', type=str, help='also save the timings as a Chrome trace JSON file to this path. Implies --profile', default=None)
+    subparser_exe.add_argument('--jobs', type=int, help='number of environments to check concurrently. By default, use a worker count based on the number of CPUs', default=None)
+    subparser_exe.add_argument('--backend', type=str, choices=['direct', 'conda-run'], help='how commands are run. "direct" activates each environment once and runs the commands directly in it, "conda-run" runs every command through `conda run`', default='direct')
+    subparser_exe.add_argument('--timeout', type=float, help='maximum number of seconds each command is allowed to run before it is killed. Use -1 to disable the timeout', default=60)
+    subparser_exe.add_argument('--cache-ttl', type=float, help='number of hours a cached result stays valid. Results of an environment are always recomputed when the environment changes. Use -1 to keep results until then', default=168)
+    subparser_exe.add_argument('--cache-size', type=int, help='maximum number of cached results. The least recently used results are evicted first', default=10000)
+
+    subparser_import = subparsers.add_parser('can-import', description='find conda environments that can import the specified python module(s), using a single python process per environment', help='find conda environments that can import the specified python module(s)')
+    subparser_import.add_argument('modules', type=str, help='module(s) to import')
+    subparser_import.add_argument('--no-cache', action='store_true', help='force to run without using cached results from previous runs')
+    subparser_import.add_argument('--first', action='store_true', help='immediately return the first environment that satisfies the requirements. By default, perform a full search over all conda environments')
+    subparser_import.add_argument('--limit', type=int, help='limit the number of environments displayed in the output. Use in conjunction with verbose', default=-1)
+    subparser_import.add_argument('--verbose', action='store_true', help='enable verbose output')
+    subparser_import.add_argument('--format', type=str, choices=['table', 'json', 'ndjson'], help='output format. "json" prints a single JSON document once the scan finishes, "ndjson" prints one JSON object per environment as soon as it is checked. Both print progress messages to stderr', default='table')
+    subparser_import.add_argument('--no-daemon', action='store_true', help='always run in this process, even if a condascan server is running')
+    subparser_import.add_argument('--profile', action='store_true', help='print how long each stage and environment took and how many subprocesses were spawned')
+    subparser_import.add_argument('--profile-output', type=str, help='also save the timings as a Chrome trace JSON file to this path. Implies --profile', default=None)
+    subparser_import.add_argument('--jobs', type=int, help='number of environments to check concurrently. By default, use a worker count based on the number of CPUs', default=None)
+    subparser_import.add_argument('--backend', type=str, choices=['direct', 'conda-run'], help='how python is started. "direct" activates each environment once and runs python directly in it, "conda-run" runs it through `conda run`', default='direct')
+    subparser_import.add_argument('--timeout', type=float, help='maximum number of seconds the python process of an environment is allowed to run before it is killed. The module being imported at that moment is reported as timed out. Use -1 to disable the timeout', default=60)
+    subparser_import.add_argument('--cache-ttl', type=float, help='number of hours a cached result stays valid. Results of an environment are always recomputed when the environment changes. Use -1 to keep results until then', default=168)
+    subparser_import.add_argument('--cache-size', type=int, help='maximum number of cached results. The least recently used results are evicted first', default=10000)
 
     subparser_compare = subparsers.add_parser('compare', description='compare different environments to find overlapping and distinct packages', help='compare different environments to find overlapping and distinct packages')
-    subparser_compare.add_argument('envs', type=str, help='environments to compare')
+    subparser_compare.add_argument('envs', type=str, nargs='?', help='environments to compare. Can be omitted when --all is used', default=None)
+    subparser_compare.add_argument('--all', action='store_true', help='compare all installed environments. Implies --matrix')
+    subparser_compare.add_argument('--matrix', action='store_true', help='summarize the comparison as a similarity matrix: package counts, packages with diverging versions and pairs of near-duplicate environments')
+    subparser_compare.add_argument('--threshold', type=float, help='minimum Jaccard similarity of the package names for two environments to be reported as near-duplicates in matrix mode', default=0.9)
     subparser_compare.add_argument('--no-cache', action='store_true', help='force to run without using cached results from previous runs')
     subparser_compare.add_argument('--pip', action='store_true', help='only compare pypi packages')
+    subparser_compare.add_argument('--format', type=str, choices=['table', 'json', 'ndjson'], help='output format. "json" prints a single JSON document once the scan finishes, "ndjson" prints one JSON object per environment as soon as it is checked. Both print progress messages to stderr', default='table')
+    subparser_compare.add_argument('--no-daemon', action='store_true', help='always run in this process, even if a condascan server is running')
+    subparser_compare.add_argument('--profile', action='store_true', help='print how long each stage and environment took and how many subprocesses were spawned')
+    subparser_compare.add_argument('--profile-output', type=str, help='also save the timings as a Chrome trace JSON file to this path. Implies --profile', default=None)
+    subparser_compare.add_argument('--jobs', type=int, help='number of environments to scan concurrently. By default, use a worker count based on the number of CPUs', default=None)
+    subparser_compare.add_argument('--snapshots', type=str, help='query the environment snapshots in this directory instead of the local conda installation. Snapshots are the outputs of "conda list" or "conda list --json", "conda env export" files or copies of environment folders with their conda-meta folder, and are named "<node>:<env>" after the folder they are in and their file name', default=None)
+
+    subparsers.add_parser('serve', description='run a background server that keeps the scanned environments in memory and answers the other commands over a local socket', help='run a background server that answers the other commands from memory')
+
+    subparser_watch = subparsers.add_parser('watch', description='watch the conda environments and update the cache as soon as an environment is created, removed or modified, so that queries never have to rescan', help='keep the cache up to date while environments change')
+    subparser_watch.add_argument('--debounce', type=float, help='number of seconds without changes to wait before updating an environment, so that an install triggers a single update', default=2)
+    subparser_watch.add_argument('--interval', type=float, help='number of seconds between checks when polling for changes', default=5)
+    subparser_watch.add_argument('--polling', action='store_true', help='poll for changes instead of using inotify')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     return args
 
+REQUIREMENT_EXTENSIONS = ('.txt', '.yml', '.yaml')
+
 def standarize_package_name(name: str):
     return name.lower().replace('_', '-')
 
-def parse_packages(packages: str):
-    if packages.endswith('.txt') or packages.endswith('.yaml') or packages.endswith('.yml'):
+def read_env_yaml(path: str) -> Tuple[List[str], List[str]]:
+    import yaml
+    with open(path, 'r') as f:
+        raw_req = yaml.safe_load(f)
+
+    conda_deps, pip_deps = [], []
+    for dep in raw_req.get('dependencies', None) or []:
+        if isinstance(dep, str):
+            conda_deps.append(dep.strip())
+        elif isinstance(dep, dict):
+            pip_deps.extend(x.strip() for x in dep.get('pip', []))
+    return conda_deps, pip_deps
+
+def split_conda_dependency(dep: str) -> Tuple[str, str, str, str]:
+    channel, _, dep = dep.rpartition('::')
+    dep = dep.split('=')
+    return dep[0], dep[1] if len(dep) > 1 else '', dep[2] if len(dep) > 2 else '', channel
+
+@profiled('parse requirements')
+def parse_packages(packages: str, verbose: bool = True):
+    from packaging.requirements import Requirement, InvalidRequirement
+
+    if packages.endswith(REQUIREMENT_EXTENSIONS):
         if not osp.exists(packages):
             console.print(f':x:[red] File "{packages}" does not exist[/red]')
             sys.exit(1)
@@ -58,19 +128,14 @@ def parse_packages(packages: str):
                         line = line.split('@')[0].strip()
                     requirements.append(line)
         else:
-            with open(packages, 'r') as f:
-                raw_req = yaml.safe_load(f)
-            
-            for dep in raw_req.get('dependencies', []):
-                if isinstance(dep, str):
-                    if dep.startswith('_'):
-                        console.print(f':warning:[yellow] Skipping package name which starts with _: "{dep}"[/yellow]')
-                        continue
-                    dep = dep.strip().split('=')
-                    requirements.append(f'{dep[0]}=={dep[1]}' if len(dep) > 1 else dep[0])
-                elif isinstance(dep, dict):
-                    for pip_dep in dep.get('pip', []):
-                        requirements.append(pip_dep.strip())
+            conda_deps, pip_deps = read_env_yaml(packages)
+            for dep in conda_deps:
+                if dep.startswith('_'):
+                    console.print(f':warning:[yellow] Skipping package name which starts with _: "{dep}"[/yellow]')
+                    continue
+                name, version, _, _ = split_conda_dependency(dep)
+                requirements.append(f'{name}=={version}' if version != '' else name)
+            requirements.extend(pip_deps)
 
     else:
         requirements = [x for x in packages.split(' ') if x != '']
@@ -83,12 +148,36 @@ def parse_packages(packages: str):
             console.print(f':x:[red] Invalid requirement "{requirements[i]}"[/red]')
             sys.exit(1)
 
+    if not verbose:
+        console.print(f'[green]:heavy_check_mark: Parsed {len(requirements)} requirements from "{packages}"[/green]')
+        return requirements
+
     console.print(f'[green]:heavy_check_mark: Requirements parsed successfully[/green]')
     for req in requirements:
         console.print(f' [green] • {req.name}{req.specifier}[/green]')
         
     return requirements
 
+def parse_batch(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if osp.isdir(path):
+            files.extend(sorted(osp.join(path, x) for x in os.listdir(path) if x.endswith(REQUIREMENT_EXTENSIONS) and osp.isfile(osp.join(path, x))))
+        elif not osp.exists(path):
+            console.print(f':x:[red] File "{path}" does not exist[/red]')
+            sys.exit(1)
+        elif not path.endswith(REQUIREMENT_EXTENSIONS):
+            console.print(f':x:[red] File "{path}" is not a requirement file, expected a .txt, .yml or .yaml file[/red]')
+            sys.exit(1)
+        else:
+            files.append(path)
+
+    files = list(dict.fromkeys(files))
+    if len(files) == 0:
+        console.print(f':x:[red] No requirement files found in {", ".join(paths)}[/red]')
+        sys.exit(1)
+    return files
+
 def parse_commands(command_arg: str):
     if command_arg.endswith('.txt'):
         if not osp.exists(command_arg):
@@ -107,6 +196,25 @@ def parse_commands(command_arg: str):
     
     return commands
 
+def parse_modules(module_arg: str):
+    if module_arg.endswith('.txt'):
+        if not osp.exists(module_arg):
+            console.print(f':x:[red] File "{module_arg}" does not exist[/red]')
+            sys.exit(1)
+        
+        with open(module_arg, 'r') as f:
+            modules = [x.strip() for x in f.readlines() if not x.startswith('#') and x.strip() != '']
+
+    else:
+        modules = [x for x in module_arg.split(' ') if x != '']
+    modules = list(dict.fromkeys(modules))
+    
+    console.print(f'[green]:heavy_check_mark: Modules parsed successfully[/green]')
+    for module in modules:
+        console.print(f' [green] • {module}[/green]')
+    
+    return modules
+
 def parse_envs(env_arg: str):
     if env_arg.endswith('.txt'):
         if not osp.exists(env_arg):
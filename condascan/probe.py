@@ -0,0 +1,58 @@
+import json
+from typing import Dict, List, Tuple, Union
+
+PROBE_MARKER = '__condascan_probe__ '
+
+# Runs inside the target environment, so it must stay compatible with old Python 3 versions.
+IMPORT_PROBE = '''
+import importlib, json, sys, time
+out = sys.stdout
+sys.stdout = sys.stderr
+out.write("%s" + json.dumps({"python": sys.version.split()[0]}) + "\\n")
+out.flush()
+for name in sys.argv[1:]:
+    start = time.perf_counter()
+    result = {"module": name, "ok": False, "version": None, "error": None}
+    try:
+        module = importlib.import_module(name)
+        result["time"] = time.perf_counter() - start
+        result["ok"] = True
+        version = getattr(module, "__version__", None)
+        if version is None:
+            try:
+                from importlib import metadata
+                version = metadata.version(name.split(".")[0])
+            except Exception:
+                version = None
+        result["version"] = None if version is None else str(version)
+    except BaseException as e:
+        result["error"] = "%%s: %%s" %% (type(e).__name__, e)
+    result.setdefault("time", time.perf_counter() - start)
+    out.write("%s" + json.dumps(result) + "\\n")
+    out.flush()
+''' % (PROBE_MARKER, PROBE_MARKER)
+
+def parse_probe_output(stdout: str) -> Tuple[Dict[str, Dict], Union[str, None]]:
+    results = {}
+    python_version = None
+    for line in stdout.splitlines():
+        if not line.startswith(PROBE_MARKER):
+            continue
+        try:
+            message = json.loads(line[len(PROBE_MARKER):])
+        except ValueError:
+            continue
+        if 'python' in message:
+            python_version = message['python']
+        elif 'module' in message:
+            results[message.pop('module')] = message
+    return results, python_version
+
+def format_probe_result(result: Dict) -> str:
+    if not result['ok']:
+        return result['error']
+    version = result['version'] if result['version'] is not None else 'unknown version'
+    return f'{version} ({result["time"] * 1000:.0f} ms)'
+
+def get_probe_command(modules: List[str]) -> List[str]:
+    return ['python', '-c', IMPORT_PROBE, *modules]
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Tuple, Union
+
+class Profiler:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.end = None
+        self.lock = threading.Lock()
+        self.spans = []
+        self.counters = {}
+
+    def add_span(self, stage: str, detail: Union[str, None], start: float, end: float):
+        with self.lock:
+            self.spans.append((stage, detail, start - self.origin, end - start, threading.get_ident()))
+
+    def increment(self, counter: str, n: int = 1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def stop(self):
+        self.end = time.perf_counter()
+
+    def get_wall_time(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.origin
+
+    def get_stage_totals(self) -> Dict[str, Tuple[int, float, float]]:
+        totals = {}
+        for stage, _, _, duration, _ in self.spans:
+            calls, total, slowest = totals.get(stage, (0, 0.0, 0.0))
+            totals[stage] = (calls + 1, total + duration, max(slowest, duration))
+        return totals
+
+    def get_slowest(self, stage: str, n: int = 5) -> List[Tuple[str, float]]:
+        durations = {}
+        for span_stage, detail, _, duration, _ in self.spans:
+            if span_stage == stage:
+                durations[detail] = durations.get(detail, 0.0) + duration
+        return sorted(durations.items(), key=lambda x: -x[1])[:n]
+
+    def to_chrome_trace(self) -> Dict:
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for stage, detail, start, duration, thread in self.spans:
+            tid = threads.setdefault(thread, len(threads))
+            event = {'name': stage if detail is None else f'{stage}: {detail}', 'cat': stage, 'ph': 'X', 'ts': round(start * 1e6, 3), 'dur': round(duration * 1e6, 3), 'pid': pid, 'tid': tid}
+            if detail is not None:
+                event['args'] = {'detail': detail}
+            events.append(event)
+        events.sort(key=lambda x: x['ts'])
+        for thread, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': 'main' if tid == 0 else f'worker {tid}'}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'wall_time': self.get_wall_time(), 'counters': self.counters}}
+
+    def write_chrome_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+_profiler = None
+
+def start_profiling() -> Profiler:
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+def stop_profiling() -> Union[Profiler, None]:
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+@contextmanager
+def profile_stage(stage: str, detail: Union[str, None] = None):
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add_span(stage, detail, start, time.perf_counter())
+
+def profiled(stage: str):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with profile_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(counter: str, n: int = 1):
+    profiler = _profiler
+    if profiler is not None:
+        profiler.increment(counter, n)
@@ -0,0 +1,39 @@
+import sys
+from typing import Any, Dict, Iterable, List, Tuple
+from condascan.codes import PackageCode
+
+def intern_record(record: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(sys.intern(x) for x in record)
+
+def intern_packages(packages: Dict[str, Iterable[str]]) -> Dict[str, Tuple[str, ...]]:
+    return {sys.intern(name): intern_record(record) for name, record in packages.items()}
+
+class RequirementResult:
+    __slots__ = ('name', 'code', 'detail')
+
+    def __init__(self, name: str, code: PackageCode, detail: Any):
+        self.name = name
+        self.code = code
+        self.detail = detail
+
+class EnvMatch:
+    __slots__ = ('env', 'requirements', 'n_packages', 'python_version', 'found', 'invalid', 'mismatch', 'ok', 'error')
+
+    def __init__(self, env: str, requirements: List[RequirementResult], n_packages: int = 0, python_version: str = '', found: int = 0, invalid: int = 0, mismatch: int = 0, ok: bool = False, error: bool = False):
+        self.env = env
+        self.requirements = requirements
+        self.n_packages = n_packages
+        self.python_version = python_version
+        self.found = found
+        self.invalid = invalid
+        self.mismatch = mismatch
+        self.ok = ok
+        self.error = error
+
+    @staticmethod
+    def from_error(env: str, detail: str = 'Error checking environment') -> 'EnvMatch':
+        return EnvMatch(env, [RequirementResult('', PackageCode.ERROR, detail)], error=True)
+
+    def get_sort_key(self) -> Tuple[bool, int, int, int, int]:
+        # Environments that could not be checked go last
+        return (self.error, -self.found, -self.invalid, -self.mismatch, self.n_packages)
@@ -0,0 +1,45 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, Callable, List, Union
+from condascan.profiling import count, profile_stage
+
+if TYPE_CHECKING:
+    from rich.progress import Progress, TaskID
+
+def map_in_processes(func: Callable[[Any], Any], items: List[Any], jobs: Union[int, None] = None) -> List[Any]:
+    workers = min(jobs or os.cpu_count() or 1, len(items))
+    if workers < 2:
+        return [func(x) for x in items]
+    count('subprocesses', workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items, chunksize=max(1, len(items) // (4 * workers))))
+
+def scan_envs(envs: List[str], check: Callable[[str], Any], progress: Union['Progress', None], task: Union['TaskID', None], jobs: Union[int, None] = None, first: bool = False, stop_event: Union[threading.Event, None] = None, on_result: Union[Callable[[Any], None], None] = None, is_ok: Callable[[Any], bool] = lambda result: result[-1]) -> List[Any]:
+    def check_env(env: str) -> Any:
+        with profile_stage('scan env', env):
+            return check(env)
+
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = {executor.submit(check_env, env): env for env in envs}
+        for future in as_completed(futures):
+            env = futures[future]
+            result = future.result()
+            results[env] = result
+            if progress is not None:
+                progress.update(task, description=f'Checked "{env}"')
+                progress.advance(task)
+            if on_result is not None:
+                on_result(result)
+            if first and is_ok(result):
+                for pending in futures:
+                    pending.cancel()
+                if stop_event is not None:
+                    stop_event.set()
+                return [result]
+    finally:
+        executor.shutdown(wait=True)
+
+    return [results[env] for env in envs if env in results]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import ntpath
+import os
+import os.path as osp
+import posixpath
+from typing import Dict, List, Union
+from condascan.cache import PackageRecords, get_env_fingerprint
+from condascan.inventory import Record, get_channel_name, parse_conda_list, build_package_records, read_conda_meta
+from condascan.parser import read_env_yaml, split_conda_dependency
+from condascan.records import intern_packages
+from condascan.scanner import map_in_processes
+
+SNAPSHOT_EXTENSIONS = ('.txt', '.json', '.yml', '.yaml')
+SNAPSHOT_SEPARATOR = ':'
+
+def is_snapshot_env(env: str) -> bool:
+    # Local envs are keyed by name, which cannot contain ':', or by their full prefix when they live outside
+    # the envs folders, which may (C:\...). Snapshot names are never absolute paths
+    return SNAPSHOT_SEPARATOR in env and not ntpath.isabs(env) and not posixpath.isabs(env)
+
+def get_snapshot_cache_prefix(root: str) -> str:
+    # Snapshots of different roots may share names, their cache entries are kept apart by the root
+    return hashlib.sha1(osp.abspath(root).encode()).hexdigest()[:12] + '/'
+
+def get_snapshot_name(root: str, path: str, is_prefix: bool) -> str:
+    parts = [x for x in osp.relpath(path, root).split(os.sep) if x not in ('.', 'envs')]
+    if not is_prefix:
+        parts[-1] = osp.splitext(parts[-1])[0]
+    if len(parts) == 0:
+        return f'{osp.basename(root)}{SNAPSHOT_SEPARATOR}base'
+    if len(parts) == 1:
+        return f'{parts[0]}{SNAPSHOT_SEPARATOR}base' if is_prefix else f'{osp.basename(root)}{SNAPSHOT_SEPARATOR}{parts[0]}'
+    return f'{parts[0]}{SNAPSHOT_SEPARATOR}{"/".join(parts[1:])}'
+
+def find_snapshots(root: str) -> Dict[str, str]:
+    root = osp.abspath(root)
+    snapshots = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if 'conda-meta' in dirnames:
+            snapshots.setdefault(get_snapshot_name(root, dirpath, True), dirpath)
+            dirnames[:] = [x for x in dirnames if x == 'envs']
+            continue
+        for filename in sorted(filenames):
+            if filename.endswith(SNAPSHOT_EXTENSIONS) and not filename.startswith('.'):
+                path = osp.join(dirpath, filename)
+                snapshots.setdefault(get_snapshot_name(root, path, False), path)
+    return dict(sorted(snapshots.items()))
+
+def get_snapshot_fingerprint(path: str) -> str:
+    if osp.isdir(path):
+        return get_env_fingerprint(path)
+    try:
+        stat = os.stat(path)
+        return hashlib.sha1(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()
+    except OSError:
+        return hashlib.sha1(f'{path}:-'.encode()).hexdigest()
+
+def parse_conda_list_json(text: str) -> List[Record]:
+    return [(x['name'], x['version'], x.get('build_string', ''), get_channel_name(x.get('channel', '')), 'conda-list') for x in json.loads(text)]
+
+def parse_conda_list_text(lines: List[str]) -> List[Record]:
+    # `conda list --export` writes name=version=build instead of columns
+    if any('=' in x and ' ' not in x.strip() for x in lines if not x.startswith('#') and not x.startswith('@')):
+        records = []
+        for line in lines:
+            line = line.strip()
+            if line == '' or line.startswith('#') or line.startswith('@'):
+                continue
+            name, version, build, channel = split_conda_dependency(line)
+            records.append((name, version, build, get_channel_name(channel) if build != 'pypi_0' else 'pypi', 'conda-list'))
+        return records
+    return parse_conda_list(lines)
+
+def parse_env_export(path: str) -> List[Record]:
+    conda_deps, pip_deps = read_env_yaml(path)
+    records = []
+    for dep in conda_deps:
+        name, version, build, channel = split_conda_dependency(dep)
+        if version != '':
+            records.append((name, version, build, get_channel_name(channel), 'env-export'))
+    for dep in pip_deps:
+        name, sep, version = dep.partition('==')
+        if sep != '':
+            records.append((name.strip(), version.strip(), 'pypi_0', 'pypi', 'env-export'))
+    return records
+
+def read_snapshot(path: str) -> Union[PackageRecords, None]:
+    try:
+        if osp.isdir(path):
+            records = read_conda_meta(path)
+        elif path.endswith('.json'):
+            with open(path, 'r') as f:
+                records = parse_conda_list_json(f.read())
+        elif path.endswith('.yml') or path.endswith('.yaml'):
+            records = parse_env_export(path)
+        else:
+            with open(path, 'r') as f:
+                records = parse_conda_list_text(f.read().splitlines())
+    except Exception:
+        return None
+    if records is None:
+        return None
+    return build_package_records(records)
+
+def ingest_snapshots(paths: List[str], jobs: Union[int, None] = None) -> List[Union[PackageRecords, None]]:
+    # Strings interned in the worker processes are copied when the results are sent back
+    return [None if x is None else intern_packages(x) for x in map_in_processes(read_snapshot, paths, jobs)]
@@ -1,278 +1,734 @@
 import argparse
+import os
+import os.path as osp
+import shlex
+import shutil
+import signal
 import subprocess
 import sys
-from typing import List, Union, Tuple, Dict
-from rich.console import Console
-from packaging.version import Version
-from packaging.requirements import Requirement
-from condascan.parser import parse_args, parse_packages, parse_commands, parse_envs, standarize_package_name
-from condascan.codes import ReturnCode, PackageCode
-from condascan.cache import get_cache, write_cache, CacheType
-from condascan.display import display_have_output, get_progress_bar, display_can_exec_output, display_compare_output
-
-console = Console()
-
-def run_shell_command(command: List[str]) -> Tuple[ReturnCode, Union[subprocess.CompletedProcess, Exception]]:
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, List, Union, Tuple, Dict
+from condascan.parser import parse_args, parse_packages, parse_batch, parse_commands, parse_modules, parse_envs
+from condascan.probe import get_probe_command, parse_probe_output
+from condascan.codes import ReturnCode, PackageCode, CommandCode
+from condascan.cache import get_env_fingerprint, CacheType, CommandCache, PackageStore, PackageRecords
+from condascan.inventory import read_conda_meta, parse_conda_list, build_package_records, get_conda_package_count
+from condascan.activation import build_activated_env
+from condascan.discovery import get_conda_root, discover_conda_envs
+from condascan.index import PackageIndex
+from condascan.records import EnvMatch, RequirementResult, intern_packages
+from condascan.snapshots import SNAPSHOT_SEPARATOR, find_snapshots, get_snapshot_cache_prefix, get_snapshot_fingerprint, ingest_snapshots, is_snapshot_env, read_snapshot
+from condascan.scanner import map_in_processes, scan_envs
+from condascan.matrix import IncidenceMatrix
+from condascan.display import display_have_output, get_progress_bar, display_can_exec_output, display_compare_output, display_json_output, display_compare_json_output, display_matrix_output, display_matrix_json_output, display_profile_output, display_batch_output, display_batch_json_output, get_have_record, get_can_exec_record, get_can_import_record
+from condascan.console import console, use_error_console, write_json
+from condascan.profiling import start_profiling, stop_profiling, profile_stage, count
+
+if TYPE_CHECKING:
+    from packaging.requirements import Requirement
+    from packaging.specifiers import SpecifierSet
+    from packaging.version import Version
+
+POLL_INTERVAL = 0.1
+
+def kill_process_tree(process: subprocess.Popen):
     try:
-        result = subprocess.run(command, check=False, capture_output=True, text=True)
-        return (ReturnCode.EXECUTED, result)
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        process.kill()
+
+def run_shell_command(command: List[str], timeout: Union[float, None] = None, cancel_event: Union[threading.Event, None] = None, env: Union[Dict[str, str], None] = None) -> Tuple[ReturnCode, Union[subprocess.CompletedProcess, Exception]]:
+    # Only the program and its first argument, the full command may embed a whole script
+    with profile_stage('subprocess', ' '.join(command[:2])):
+        return _run_shell_command(command, timeout, cancel_event, env)
+
+def _run_shell_command(command: List[str], timeout: Union[float, None] = None, cancel_event: Union[threading.Event, None] = None, env: Union[Dict[str, str], None] = None) -> Tuple[ReturnCode, Union[subprocess.CompletedProcess, Exception]]:
+    try:
+        if env is not None:
+            executable = shutil.which(command[0], path=env.get('PATH'))
+            if executable is None:
+                raise FileNotFoundError(f'Command not found: {command[0]}')
+            command = [executable, *command[1:]]
+        if os.name == 'nt':
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, start_new_session=True)
     except FileNotFoundError as e:
         return (ReturnCode.COMMAND_NOT_FOUND, e)
     except Exception as e:
         return (ReturnCode.UNHANDLED_ERROR, e)
 
+    count('subprocesses')
+    start = time.monotonic()
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=POLL_INTERVAL)
+                return (ReturnCode.EXECUTED, subprocess.CompletedProcess(command, process.returncode, stdout, stderr))
+            except subprocess.TimeoutExpired as e:
+                if cancel_event is not None and cancel_event.is_set():
+                    kill_process_tree(process)
+                    process.communicate()
+                    return (ReturnCode.CANCELLED, e)
+                if timeout is not None and time.monotonic() - start > timeout:
+                    kill_process_tree(process)
+                    stdout, stderr = process.communicate()
+                    return (ReturnCode.TIMEOUT, subprocess.TimeoutExpired(command, timeout, stdout, stderr))
+    except Exception as e:
+        kill_process_tree(process)
+        return (ReturnCode.UNHANDLED_ERROR, e)
+
 def is_conda_installed() -> bool:
+    if get_conda_root() is not None:
+        return True
     result = run_shell_command(['conda', '--version'])
     if result[0] == ReturnCode.EXECUTED:
         return result[1].returncode == 0
     return False
 
-def get_conda_envs() -> List[str]:
+def get_conda_envs() -> Dict[str, str]:
+    envs = discover_conda_envs()
+    if envs is not None:
+        return envs
+
     result = run_shell_command(['conda', 'env', 'list'])
     if result[0] != ReturnCode.EXECUTED:
-        return []
+        return {}
 
-    envs = []
+    envs = {}
     for line in result[1].stdout.splitlines():
         if line != '' and not line.startswith('#'):
-            env = line.split(' ')[0]
-            if env != '':
-                envs.append(env)
+            line = [x for x in line.split(' ') if x != '']
+            if len(line) > 0:
+                envs[line[0]] = line[-1]
     return envs
 
-def try_get_version(version: str) -> bool:
+def get_env_packages(prefix: str) -> Union[PackageRecords, None]:
+    records = read_conda_meta(prefix)
+    if records is None:
+        result = run_shell_command(['conda', 'list', '-p', prefix])
+        if result[0] != ReturnCode.EXECUTED or result[1].returncode != 0:
+            return None
+        records = parse_conda_list(result[1].stdout.splitlines())
+    return build_package_records(records)
+
+@lru_cache(maxsize=None)
+def try_get_version(version: str) -> Union['Version', None]:
+    from packaging.version import Version
     try:
         return Version(version)
     except Exception:
         return None
 
+@lru_cache(maxsize=None)
+def specifier_contains(specifier: 'SpecifierSet', version: 'Version') -> bool:
+    return specifier.contains(version)
+
 class Task:
-    def __init__(self, args: argparse.Namespace):
+    def __init__(self, args: argparse.Namespace, state: Union[Dict, None] = None):
         self.args = args
+        self.state = state if state is not None else {}
+        self.read_envs = set()
 
     def parse_args(self):
         raise NotImplementedError()
     
     def initialize_and_verify(self):
+        if self.args.format != 'table':
+            use_error_console()
         console.print('[bold]Initial checks[/bold]')
         if self.args.subcommand != 'compare' and self.args.limit <= 0 and self.args.limit != -1:
             console.print('[red]Limit argument must be greater than 0[/red]')
             sys.exit(1)
+        if getattr(self.args, 'jobs', None) is not None and self.args.jobs <= 0:
+            console.print('[red]Jobs argument must be greater than 0[/red]')
+            sys.exit(1)
+        if getattr(self.args, 'timeout', -1) <= 0 and getattr(self.args, 'timeout', -1) != -1:
+            console.print('[red]Timeout argument must be greater than 0[/red]')
+            sys.exit(1)
+        if getattr(self.args, 'cache_ttl', -1) <= 0 and getattr(self.args, 'cache_ttl', -1) != -1:
+            console.print('[red]Cache TTL argument must be greater than 0[/red]')
+            sys.exit(1)
+        if getattr(self.args, 'cache_size', 1) <= 0:
+            console.print('[red]Cache size argument must be greater than 0[/red]')
+            sys.exit(1)
+        if not 0 <= getattr(self.args, 'threshold', 0) <= 1:
+            console.print('[red]Threshold argument must be between 0 and 1[/red]')
+            sys.exit(1)
 
-        if is_conda_installed():
+        self.snapshots = getattr(self.args, 'snapshots', None) is not None
+        if self.snapshots:
+            if not osp.isdir(self.args.snapshots):
+                console.print(f'[red]:x: Snapshot directory "{self.args.snapshots}" does not exist[/red]')
+                sys.exit(1)
+            with profile_stage('discover envs'):
+                self.env_prefixes = find_snapshots(self.args.snapshots)
+            if len(self.env_prefixes) == 0:
+                console.print(f'[red]:x: No snapshots found in "{self.args.snapshots}"[/red]')
+                sys.exit(1)
+            console.print(f'[green]:heavy_check_mark: Found {len(self.env_prefixes)} snapshots in "{self.args.snapshots}"[/green]')
+            self.cache_prefix = get_snapshot_cache_prefix(self.args.snapshots)
+        elif is_conda_installed():
             console.print('[green]:heavy_check_mark: Conda is installed[/green]')
+            with profile_stage('discover envs'):
+                self.env_prefixes = get_conda_envs()
         else:
             console.print('[red]:x: Conda is not installed or not found in PATH[/red]')
             sys.exit(1)
-        
-        self.conda_envs = get_conda_envs()
+        self.conda_envs = list(self.env_prefixes.keys())
         self.process_args = self.parse_args()
 
         console.print()
-        if not self.args.no_cache:
-            self.cached_envs = get_cache(self.cache_type)
+        if self.cache_type == CacheType.PACKAGES:
+            # A request without cache gets its own store, the shared one keeps serving later requests of the server
+            if self.args.no_cache:
+                self.package_store = PackageStore(False)
+            else:
+                if 'package_store' not in self.state:
+                    self.state['package_store'] = PackageStore()
+                self.package_store = self.state['package_store']
+            self.package_store.prune([self._cache_key(x) for x in self.conda_envs], self._in_scope)
+            if not self.args.no_cache:
+                console.print('[bold]Running using cache. Environments that changed since the last time you run this command will be rescanned[/bold]')
+            else:
+                console.print('[bold yellow]Running without cache, this may take a while[/bold yellow]')
         else:
-            self.cached_envs = {}
-            console.print('[bold yellow]Running without cache, this may take a while[/bold yellow]')
+            if 'command_cache' not in self.state:
+                self.state['command_cache'] = CommandCache()
+            self.command_cache = self.state['command_cache']
+            self.command_cache.use_cache = not self.args.no_cache
+            self.command_cache.ttl = None if self.args.cache_ttl == -1 else self.args.cache_ttl * 3600
+            self.command_cache.max_entries = self.args.cache_size
+            self.command_cache.prune(self.conda_envs)
+            if not self.args.no_cache:
+                console.print('[bold]Running using cache. Results of environments that changed since the last time you run this command will be recomputed[/bold]')
+            else:
+                console.print('[bold yellow]Running without cache, this may take a while[/bold yellow]')
 
     def process(self):
         raise NotImplementedError()
 
+    def get_record(self, result: Any) -> Dict:
+        raise NotImplementedError()
+
+    def _cache_key(self, env: str) -> str:
+        return self.cache_prefix + env if self.snapshots else env
+
+    def _in_scope(self, key: str) -> bool:
+        if not self.snapshots:
+            return not is_snapshot_env(key)
+        # Entries written before snapshot keys had a root prefix are pruned too
+        return key.startswith(self.cache_prefix) or (is_snapshot_env(key) and '/' not in key.split(SNAPSHOT_SEPARATOR)[0])
+
+    def _get_fingerprint(self, env: str) -> str:
+        if self.snapshots:
+            return get_snapshot_fingerprint(self.env_prefixes[env])
+        return get_env_fingerprint(self.env_prefixes[env])
+
+    def _needs_scan(self, env: str, fingerprint: str) -> bool:
+        return self.package_store.get(self._cache_key(env), fingerprint) is None
+
+    def _get_env_size(self, env: str) -> int:
+        size = get_conda_package_count(self.env_prefixes[env])
+        return size if size is not None else sys.maxsize
+
+    def _scan_first(self, check: Callable[[str], Any], get_priority: Callable[[str], Tuple], stop_event: Union[threading.Event, None] = None, is_ok: Callable[[Any], bool] = lambda result: result[-1]) -> List[Any]:
+        with profile_stage('rank envs'):
+            priorities = {env: get_priority(env) for env in self.conda_envs}
+        envs = sorted(self.conda_envs, key=priorities.get)
+
+        # Check the envs the caches say will match on their own, scans that already started are waited for even after a match
+        likely = [env for env in envs if priorities[env][0] == 0]
+        results = self._scan(likely, check, True, stop_event, is_ok) if len(likely) > 0 else []
+        if any(is_ok(x) for x in results):
+            return results
+        return results + self._scan(envs[len(likely):], check, True, stop_event, is_ok)
+
+    def _read_stale_packages(self, envs: List[str]):
+        # Parsing inventories is CPU bound, so they are read by a pool of processes rather than by the scan threads
+        fingerprints = {env: self._get_fingerprint(env) for env in envs}
+        stale = [env for env in envs if self._needs_scan(env, fingerprints[env]) and self.package_store.get(self._cache_key(env), fingerprints[env]) is None]
+        if len(stale) < 2:
+            return
+        if self.snapshots:
+            console.print(f'[bold]Ingesting {len(stale)} snapshots[/bold]')
+            with profile_stage('ingest snapshots'):
+                results = ingest_snapshots([self.env_prefixes[env] for env in stale], self.args.jobs)
+        else:
+            with profile_stage('read packages', f'{len(stale)} environments'):
+                results = map_in_processes(get_env_packages, [self.env_prefixes[env] for env in stale], self.args.jobs)
+            results = [None if x is None else intern_packages(x) for x in results]
+        for env, packages in zip(stale, results):
+            if packages is not None:
+                self.package_store.set(self._cache_key(env), fingerprints[env], packages)
+                self.read_envs.add(env)
+
+    def _scan(self, envs: List[str], check: Callable[[str], Any], first: bool = False, stop_event: Union[threading.Event, None] = None, is_ok: Callable[[Any], bool] = lambda result: result[-1], stream: bool = True) -> List[Any]:
+        # With --first, local environments are read lazily so the scan can stop early
+        if self.cache_type == CacheType.PACKAGES and (self.snapshots or not first):
+            self._read_stale_packages(envs)
+        if self.args.format == 'table':
+            with get_progress_bar() as progress:
+                task = progress.add_task('Checking conda environments', total=len(envs))
+                return scan_envs(envs, check, progress, task, self.args.jobs, first, stop_event, is_ok=is_ok)
+
+        on_result = (lambda result: write_json(self.get_record(result))) if self.args.format == 'ndjson' and stream else None
+        return scan_envs(envs, check, None, None, self.args.jobs, first, stop_event, on_result, is_ok)
+
+    def _get_installed_packages(self, env: str, fingerprint: Union[str, None] = None) -> Union[PackageRecords, None]:
+        if fingerprint is None:
+            fingerprint = self._get_fingerprint(env)
+        packages = self.package_store.get(self._cache_key(env), fingerprint)
+        if packages is not None:
+            count('package cache misses' if env in self.read_envs else 'package cache hits')
+            return packages
+
+        count('package cache misses')
+        with profile_stage('read packages', env):
+            packages = read_snapshot(self.env_prefixes[env]) if self.snapshots else get_env_packages(self.env_prefixes[env])
+        if packages is not None:
+            self.package_store.set(self._cache_key(env), fingerprint, packages)
+        return packages
+
     @staticmethod
-    def from_args(args: argparse.Namespace):
+    def from_args(args: argparse.Namespace, state: Union[Dict, None] = None):
         if args.subcommand == 'have':
-            return TaskFind(args)
+            return TaskFind(args, state)
         elif args.subcommand == 'can-execute':
-            return TaskCanExecute(args)
+            return TaskCanExecute(args, state)
+        elif args.subcommand == 'can-import':
+            return TaskCanImport(args, state)
         else:
-            return TaskCompare(args)
+            return TaskCompare(args, state)
+
+def run_task(args: argparse.Namespace, state: Union[Dict, None] = None):
+    profile = args.profile or args.profile_output is not None
+    if profile:
+        start_profiling()
+    try:
+        task = Task.from_args(args, state)
+        task.initialize_and_verify()
+        task.process()
+    finally:
+        if profile:
+            profiler = stop_profiling()
+            display_profile_output(profiler)
+            if args.profile_output is not None:
+                try:
+                    profiler.write_chrome_trace(args.profile_output)
+                    console.print(f'[bold]Trace saved to "{args.profile_output}". Open it in chrome://tracing or https://ui.perfetto.dev[/bold]')
+                except OSError as e:
+                    console.print(f'[red]Error: Failed to write the trace to "{args.profile_output}": {str(e)}[/red]')
 
 class TaskFind(Task):
-    def __init__(self, args: argparse.Namespace):
-        super().__init__(args)
+    def __init__(self, args: argparse.Namespace, state: Union[Dict, None] = None):
+        super().__init__(args, state)
         self.cache_type = CacheType.PACKAGES
 
     def parse_args(self):
-        return parse_packages(self.args.packages)
-
-    def _check_packages_in_env(self, env: str, requirements: List[Requirement]) -> Tuple[Tuple, List, str, bool]:
-        if self.cached_envs.get(env) is None:
-            result = run_shell_command(['conda', 'list', '-n', env])
-            if result[0] != ReturnCode.EXECUTED:
-                return (), [('', (PackageCode.ERROR, 'Error checking environment'))], '', False
-            self.cached_envs[env] = result[1].stdout.splitlines()
-        installed_packages = self.cached_envs[env]
-
-        package_status = {x.name: (PackageCode.MISSING, x.specifier) for x in requirements}
-        scores = [0, 0, 0, len(installed_packages)] # found, invalid, mismatch, #packages 
-        python_version = 'Not Available'
+        self.batch = None
+        if self.args.batch is not None:
+            if self.args.packages is not None:
+                console.print('[red]Error: Either pass the package(s) to search for or use --batch, not both[/red]')
+                sys.exit(1)
+            if self.args.first:
+                console.print('[red]Error: --first cannot be used with --batch[/red]')
+                sys.exit(1)
+            self.batch = [(file, parse_packages(file, verbose=False)) for file in parse_batch(self.args.batch)]
+            self.requirement_names = list(dict.fromkeys(x.name for _, requirements in self.batch for x in requirements))
+            return None
+        if self.args.packages is None:
+            console.print('[red]Error: Pass the package(s) to search for or use --batch[/red]')
+            sys.exit(1)
+
+        requirements = parse_packages(self.args.packages)
+        self.requirement_names = list(dict.fromkeys(x.name for x in requirements))
+        return requirements
 
-        try:
-            for line in installed_packages:
-                if line != '' and not line.startswith('#'):
-                    line = [x for x in line.split(' ') if x != '']
-                    package, version = line[0], line[1]
-                    if package == '':
+    def initialize_and_verify(self):
+        super().initialize_and_verify()
+        if self.args.no_cache:
+            self.package_index = PackageIndex(False)
+        else:
+            if 'package_index' not in self.state:
+                self.state['package_index'] = PackageIndex()
+            else:
+                # `condascan watch` may have updated the index since the last request
+                self.state['package_index'].reload()
+            self.package_index = self.state['package_index']
+        self.package_index.prune([self._cache_key(x) for x in self.conda_envs], self._in_scope)
+
+    def _needs_scan(self, env: str, fingerprint: str) -> bool:
+        return not self.package_index.is_fresh(self._cache_key(env), fingerprint)
+
+    def _update_index(self, env: str) -> bool:
+        fingerprint = self._get_fingerprint(env)
+        if not self.package_index.is_fresh(self._cache_key(env), fingerprint):
+            packages = self._get_installed_packages(env, fingerprint)
+            if packages is None:
+                return False
+            self.package_index.update_env(self._cache_key(env), fingerprint, packages)
+        return True
+
+    def _check_packages_in_env(self, env: str, requirements: List['Requirement']) -> EnvMatch:
+        if not self._update_index(env):
+            return EnvMatch.from_error(env)
+        installed_packages = self.package_index.lookup(self._cache_key(env), self.requirement_names)
+        return self._match_requirements(env, requirements, installed_packages)
+
+    def _check_batch_in_env(self, env: str) -> Tuple[str, List[EnvMatch]]:
+        if not self._update_index(env):
+            return env, [EnvMatch.from_error(env)] * len(self.batch)
+        installed_packages = self.package_index.lookup(self._cache_key(env), self.requirement_names)
+        return env, [self._match_requirements(env, requirements, installed_packages) for _, requirements in self.batch]
+
+    def _match_requirements(self, env: str, requirements: List['Requirement'], installed_packages: Dict[str, str]) -> EnvMatch:
+        n_packages, python_version = self.package_index.get_env_info(self._cache_key(env))
+        package_status = {x.name: RequirementResult(x.name, PackageCode.MISSING, x.specifier) for x in requirements}
+        match = EnvMatch(env, list(package_status.values()), n_packages, python_version)
+
+        with profile_stage('match requirements', env):
+            try:
+                for req in requirements:
+                    raw_version = installed_packages.get(req.name)
+                    if raw_version is None:
                         continue
-                    
-                    package = standarize_package_name(package)
-                    version = try_get_version(version)
-
-                    for req in requirements:
-                        if req.name == package:
-                            if version is None:
-                                package_status[req.name] = (PackageCode.VERSION_INVALID, f'Expected "{req.specifier}", found "{version}". Version is not in PEP 440 format.')
-                                scores[1] += 1
-                            elif req.specifier == '' or req.specifier.contains(version):
-                                package_status[req.name] = (PackageCode.FOUND, version)
-                                scores[0] += 1
-                            else:
-                                package_status[req.name] = (PackageCode.VERSION_MISMATCH, f'Expected "{req.specifier}", found "{version}"')
-                                scores[2] += 1
-                    
-                    if package == 'python':
-                        python_version = version
-
-                    if scores[0] == len(requirements) and python_version != 'Not Available':
-                        break
-        except Exception as e:
-            console.print(f'[red]Unhandled Error in processing "{env}": {str(e)} [/red]')
-            sys.exit(1)
 
-        return scores, [(package, status) for package, status in package_status.items()], python_version, scores[0] == len(requirements)
+                    status = package_status[req.name]
+                    version = try_get_version(raw_version)
+                    if version is None:
+                        status.code, status.detail = PackageCode.VERSION_INVALID, f'Expected "{req.specifier}", found "{raw_version}". Version is not in PEP 440 format.'
+                        match.invalid += 1
+                    elif req.specifier == '' or specifier_contains(req.specifier, version):
+                        status.code, status.detail = PackageCode.FOUND, version
+                        match.found += 1
+                    else:
+                        status.code, status.detail = PackageCode.VERSION_MISMATCH, f'Expected "{req.specifier}", found "{version}"'
+                        match.mismatch += 1
+            except Exception as e:
+                console.print(f'[red]Unhandled Error in processing "{env}": {str(e)} [/red]')
+                sys.exit(1)
+
+        match.ok = match.found == len(requirements)
+        return match
     
+    def _get_first_priority(self, env: str) -> Tuple[int, int, int]:
+        # Envs whose up to date index entry satisfies the requirements go first, then the envs that had the most
+        # required packages when they were last indexed, smallest first. Envs known to miss a requirement go last
+        fingerprint = self._get_fingerprint(env)
+        key = self._cache_key(env)
+        if self.package_index.is_fresh(key, fingerprint):
+            match = self._match_requirements(env, self.process_args, self.package_index.lookup(key, self.requirement_names))
+            return (0 if match.ok else 2, -match.found, match.n_packages)
+        if key in self.package_index.envs:
+            return (1, -len(self.package_index.lookup(key, self.requirement_names)), self.package_index.get_env_info(key)[0])
+        return (1, 0, self._get_env_size(env))
+
+    def get_record(self, result: EnvMatch) -> Dict:
+        return get_have_record(result)
+
+    def _process_batch(self):
+        # Results are only written per requirement file, once every environment is checked
+        results = self._scan(self.conda_envs, self._check_batch_in_env, stream=False)
+
+        self.package_store.flush()
+        self.package_index.flush()
+        batch_results = []
+        for i, (file, requirements) in enumerate(self.batch):
+            ranked = sorted([env_results[i] for _, env_results in results], key=EnvMatch.get_sort_key)
+            batch_results.append((file, requirements, ranked))
+        with profile_stage('render'):
+            if self.args.format == 'table':
+                display_batch_output(batch_results, self.args.verbose)
+            else:
+                display_batch_json_output(batch_results, self.args.format == 'ndjson')
+
     def process(self):
-        filtered_envs = []
-
-        with get_progress_bar(console) as progress:
-            task = progress.add_task('Checking conda environments', total=len(self.conda_envs))
-            for env in self.conda_envs:
-                progress.update(task, description=f'Checking "{env}"')
-                result = (env,  *self._check_packages_in_env(env, self.process_args))
-                filtered_envs.append(result)
-                progress.advance(task)
-                if self.args.first and result[-1]:
-                    filtered_envs = [result]
-                    break
+        if self.batch is not None:
+            self._process_batch()
+            return
+
+        check = lambda env: self._check_packages_in_env(env, self.process_args)
+        if self.args.first:
+            filtered_envs = self._scan_first(check, self._get_first_priority, is_ok=lambda x: x.ok)
+        else:
+            filtered_envs = self._scan(self.conda_envs, check)
         
-        write_cache(self.cached_envs, self.cache_type)
-        filtered_envs.sort(key=lambda x: (-x[1][0], -x[1][1], -x[1][2], x[1][3]))
-        display_have_output(filtered_envs, self.args.limit, self.args.verbose, self.args.first)
+        self.package_store.flush()
+        self.package_index.flush()
+        filtered_envs.sort(key=EnvMatch.get_sort_key)
+        with profile_stage('render'):
+            if self.args.format == 'json':
+                display_json_output([self.get_record(x) for x in filtered_envs], self.args.limit)
+            elif self.args.format == 'table':
+                display_have_output(filtered_envs, self.args.limit, self.args.verbose, self.args.first)
     
 class TaskCanExecute(Task):
-    def __init__(self, args: argparse.Namespace):
-        super().__init__(args)
+    action = 'execute the command'
+
+    def __init__(self, args: argparse.Namespace, state: Union[Dict, None] = None):
+        super().__init__(args, state)
         self.cache_type = CacheType.COMMANDS
 
     def parse_args(self):
         return parse_commands(self.args.commands)
+
+    def _get_cache_commands(self) -> List[str]:
+        return self.process_args
+
+    def _get_first_priority(self, env: str) -> Tuple[int, int, int]:
+        # Envs whose cached results show every command succeeding go first, then the envs where the most commands
+        # succeeded before they changed, smallest first. Envs with an up to date failure go last
+        fingerprint = get_env_fingerprint(self.env_prefixes[env])
+        history = [self.command_cache.peek(env, x) for x in self._get_cache_commands()]
+        known = [x for x in history if x is not None]
+        if any(x[0] == fingerprint and not x[1] for x in known):
+            group = 2
+        elif len(known) == len(history) and all(x[0] == fingerprint for x in known):
+            group = 0
+        else:
+            group = 1
+        return (group, -sum(x[1] for x in known), self._get_env_size(env))
     
+    def _get_activated_env(self, env: str) -> Union[Dict[str, str], None]:
+        prefix = self.env_prefixes[env]
+        fingerprint = get_env_fingerprint(prefix)
+        environ = dict(os.environ)
+        # A server keeps activated environments across requests made with different variables
+        activated_envs = self.state.setdefault('activated_envs', {})
+        if activated_envs.get(prefix, (None, None))[:2] != (fingerprint, environ):
+            with profile_stage('activate env', env):
+                activated_envs[prefix] = (fingerprint, environ, build_activated_env(env, prefix))
+        return activated_envs[prefix][2]
+
+    def _run_in_env(self, env: str, command: Union[str, List[str]]) -> Tuple[ReturnCode, Union[subprocess.CompletedProcess, Exception]]:
+        timeout = None if self.args.timeout == -1 else self.args.timeout
+        if isinstance(command, str):
+            try:
+                command = shlex.split(command, posix=os.name != 'nt')
+            except ValueError as e:
+                return (ReturnCode.EXECUTED, subprocess.CompletedProcess(command, 1, '', f'Invalid command: {str(e)}'))
+
+        activated_env = self._get_activated_env(env) if self.args.backend == 'direct' else None
+        if activated_env is None:
+            return run_shell_command(['conda', 'run', '-p', self.env_prefixes[env], *command], timeout, self.stop_event)
+        return run_shell_command(command, timeout, self.stop_event, activated_env)
+
     def _can_execute_in_env(self, env: str, commands: List[str]) -> Tuple[List, str, bool]:
         results = []
         valid = True
         
+        fingerprint = get_env_fingerprint(self.env_prefixes[env])
         python_version = 'Not Available'
         python_command = 'python --version'
-        if self.cached_envs.get(env, {}).get(python_command) is None:
-            result = run_shell_command(['conda', 'run', '-n', env, *python_command.split(' ')])
-            if result[0] != ReturnCode.EXECUTED:
-                return [('', (PackageCode.ERROR, 'Error checking environment'))], '', False
-            if result[1].returncode == 0:
-                exec_result = result[1].stdout.strip()
-                if exec_result.startswith('Python '):
-                    python_version = exec_result.split(' ')[1]
-                else:
-                    python_version = exec_result
-                exec_result = python_version
-            self.cached_envs.setdefault(env, {})[python_command] = (True, exec_result)
-        python_version = self.cached_envs[env][python_command][1]
+        cached = self.command_cache.get(env, fingerprint, python_command)
+        if cached is None:
+            result = self._run_in_env(env, python_command)
+            if result[0] == ReturnCode.EXECUTED:
+                if result[1].returncode == 0:
+                    exec_result = result[1].stdout.strip()
+                    if exec_result.startswith('Python '):
+                        python_version = exec_result.split(' ')[1]
+                    else:
+                        python_version = exec_result
+                self.command_cache.set(env, fingerprint, python_command, (True, python_version))
+            elif result[0] == ReturnCode.COMMAND_NOT_FOUND:
+                self.command_cache.set(env, fingerprint, python_command, (True, python_version))
+            elif result[0] != ReturnCode.TIMEOUT:
+                return [('', (CommandCode.ERROR, 'Error checking environment'))], '', False
+        else:
+            python_version = cached[1]
 
         for command in commands:
-            if self.cached_envs.get(env, {}).get(command) is None:
-                result = run_shell_command(['conda', 'run', '-n', env, *command.split(' ')])
-                if result[0] != ReturnCode.EXECUTED:
-                    return [('', (PackageCode.ERROR, 'Error checking environment'))], '', False
-                if result[1].returncode == 0:
+            cached = self.command_cache.get(env, fingerprint, command)
+            if cached is None:
+                result = self._run_in_env(env, command)
+                if result[0] == ReturnCode.TIMEOUT:
+                    results.append((command, (CommandCode.TIMEOUT, f'Timed out after {self.args.timeout} seconds')))
+                    valid = False
+                    continue
+                if result[0] == ReturnCode.COMMAND_NOT_FOUND:
+                    exec_result = (False, str(result[1]))
+                elif result[0] != ReturnCode.EXECUTED:
+                    return [('', (CommandCode.ERROR, 'Error checking environment'))], '', False
+                elif result[1].returncode == 0:
                     exec_result = (True, result[1].stdout.strip())
                 else:
-                    valid = False
-                    error = result[1].stderr.strip()
-                    conda_log_idx = error.index('\n\nERROR conda.cli.main_run:execute')
-                    error = error[:conda_log_idx]
-                    exec_result = (False, error)
-
-                self.cached_envs.setdefault(env, {})[command] = exec_result
-            exec_result = self.cached_envs[env][command]
-            valid = valid and exec_result[0]
+                    error = result[1].stderr
+                    conda_log_idx = error.find('ERROR conda.cli.main_run:execute')
+                    if conda_log_idx != -1:
+                        error = error[:conda_log_idx]
+                    error = error.strip()
+                    exec_result = (False, error if error != '' else f'Exited with code {result[1].returncode}')
+
+                self.command_cache.set(env, fingerprint, command, exec_result)
+                cached = exec_result
+            success, detail = cached
+            valid = valid and success
             
-            results.append((command, exec_result))
+            results.append((command, (CommandCode.SUCCESS if success else CommandCode.FAILED, detail)))
 
         return results, python_version, valid
     
+    def get_record(self, result: Tuple) -> Dict:
+        return get_can_exec_record(result)
+
     def process(self):
-        filtered_envs = []
-        with get_progress_bar(console) as progress:
-            task = progress.add_task('Checking conda environments', total=len(self.conda_envs))
-            
-            for env in self.conda_envs:
-                progress.update(task, description=f'Checking "{env}"')
-                result = (env,  *self._can_execute_in_env(env, self.process_args))
-                filtered_envs.append(result)
-                progress.advance(task)
-                if self.args.first and result[-1]:
-                    filtered_envs = [result]
-                    break
+        self.stop_event = threading.Event()
+        check = lambda env: (env, *self._can_execute_in_env(env, self.process_args))
+        if self.args.first:
+            filtered_envs = self._scan_first(check, self._get_first_priority, self.stop_event)
+        else:
+            filtered_envs = self._scan(self.conda_envs, check, stop_event=self.stop_event)
         
-        write_cache(self.cached_envs, self.cache_type)
+        self.command_cache.flush()
         filtered_envs.sort(key=lambda x: (-x[3]))
-        display_can_exec_output(filtered_envs, self.args.limit, self.args.verbose, self.args.first)
+        with profile_stage('render'):
+            if self.args.format == 'json':
+                display_json_output([self.get_record(x) for x in filtered_envs], self.args.limit)
+            elif self.args.format == 'table':
+                display_can_exec_output(filtered_envs, self.args.limit, self.args.verbose, self.args.first, self.action)
+
+class TaskCanImport(TaskCanExecute):
+    action = 'import the modules'
+
+    def parse_args(self):
+        return parse_modules(self.args.modules)
+
+    def get_record(self, result: Tuple) -> Dict:
+        return get_can_import_record(result)
+
+    def _get_cache_commands(self) -> List[str]:
+        return [f'import {x}' for x in self.process_args]
+
+    def _probe_modules(self, env: str, modules: List[str]) -> Union[Tuple[Dict[str, Dict], Union[str, None]], None]:
+        results = {}
+        python_version = None
+        remaining = list(modules)
+        while len(remaining) > 0:
+            result = self._run_in_env(env, get_probe_command(remaining))
+            if result[0] == ReturnCode.COMMAND_NOT_FOUND:
+                for module in remaining:
+                    results[module] = {'ok': False, 'version': None, 'error': 'Python is not available in this environment', 'time': 0}
+                break
+            if result[0] not in (ReturnCode.EXECUTED, ReturnCode.TIMEOUT):
+                return None
+
+            stdout = result[1].stdout if result[0] == ReturnCode.EXECUTED else result[1].output
+            probed, version = parse_probe_output(stdout or '')
+            results.update(probed)
+            python_version = version or python_version
+            remaining = [x for x in remaining if x not in results]
+            if len(remaining) == 0:
+                break
+
+            # The interpreter died or hung while importing the first unreported module; record it and continue with the rest
+            module = remaining.pop(0)
+            if result[0] == ReturnCode.TIMEOUT:
+                results[module] = {'ok': False, 'version': None, 'error': f'Timed out after {self.args.timeout} seconds', 'time': self.args.timeout, 'timeout': True}
+            else:
+                stderr = result[1].stderr.strip().splitlines()
+                error = stderr[-1] if len(stderr) > 0 else f'Python exited with code {result[1].returncode}'
+                results[module] = {'ok': False, 'version': None, 'error': error, 'time': 0}
+        return results, python_version
+
+    def _can_execute_in_env(self, env: str, modules: List[str]) -> Tuple[List, str, bool]:
+        fingerprint = get_env_fingerprint(self.env_prefixes[env])
+        python_command = 'python --version'
+        cached = {x: self.command_cache.get(env, fingerprint, x) for x in [python_command, *[f'import {x}' for x in modules]]}
+        missing = [x for x in modules if cached[f'import {x}'] is None]
+        if len(missing) > 0:
+            probe = self._probe_modules(env, missing)
+            if probe is None:
+                return [('', (CommandCode.ERROR, 'Error checking environment'))], '', False
+            probed, python_version = probe
+            if python_version is not None:
+                cached[python_command] = (True, python_version)
+                self.command_cache.set(env, fingerprint, python_command, cached[python_command])
+            for module, result in probed.items():
+                if not result.pop('timeout', False):
+                    cached[f'import {module}'] = (result['ok'], result)
+                    self.command_cache.set(env, fingerprint, f'import {module}', cached[f'import {module}'])
+
+        results = []
+        valid = True
+        for module in modules:
+            entry = cached.get(f'import {module}')
+            if entry is None:
+                results.append((module, (CommandCode.TIMEOUT, probed[module]['error'])))
+                valid = False
+                continue
+            success, result = entry
+            valid = valid and success
+            results.append((module, (CommandCode.SUCCESS if success else CommandCode.FAILED, result)))
+
+        python_version = (cached[python_command] or (True, 'Not Available'))[1]
+        return results, python_version, valid
 
 class TaskCompare(Task):
-    def __init__(self, args: argparse.Namespace):
-        super().__init__(args)
+    def __init__(self, args: argparse.Namespace, state: Union[Dict, None] = None):
+        super().__init__(args, state)
         self.cache_type = CacheType.PACKAGES
 
     def parse_args(self):
+        if self.args.all:
+            if self.args.envs is not None:
+                console.print('[red]Error: Either pass the environments to compare or use --all, not both[/red]')
+                sys.exit(1)
+            if len(self.conda_envs) < 2:
+                console.print(':x:[red] At least two environments are required for comparison[/red]')
+                sys.exit(1)
+            return self.conda_envs
+        if self.args.envs is None:
+            console.print('[red]Error: Pass the environments to compare or use --all[/red]')
+            sys.exit(1)
         return parse_envs(self.args.envs)
     
+    def _get_packages_version(self, env: str) -> Tuple[Dict[str, str]]:
+        packages = self._get_installed_packages(env)
+        if packages is None:
+            console.print(f'[red]Error: Failed to read the installed packages of "{env}"[/red]')
+            sys.exit(1)
+
+        return ({package: version for package, (version, _, channel, _) in packages.items() if not self.args.pip or channel == 'pypi'},)
+
     def process(self):
-        with get_progress_bar(console) as progress:
-            all_envs = set(self.conda_envs)
-            envs = set(self.process_args)
-            if not envs.issubset(all_envs):
-                console.print(f'[red]Error: Some environments {envs - all_envs} are not found in the installed environments[/red]')
-                sys.exit(1)
+        all_envs = set(self.conda_envs)
+        envs = list(dict.fromkeys(self.process_args))
+        if not set(envs).issubset(all_envs):
+            console.print(f'[red]Error: Some environments {set(envs) - all_envs} are not found in the installed environments[/red]')
+            sys.exit(1)
 
-            task = progress.add_task('Checking conda environments', total=len(envs))
-            installed_packages = {}
-            packages_version = {}
-
-            for env in envs:
-                progress.update(task, description=f'Checking "{env}"')
-
-                if self.cached_envs.get(env) is None:
-                    result = run_shell_command(['conda', 'list', '-n', env])
-                    if result[0] != ReturnCode.EXECUTED:
-                        return (), [('', (PackageCode.ERROR, 'Error checking environment'))], '', False #TODO: check this
-                    
-                    self.cached_envs[env] = result[1].stdout.splitlines()
-
-                out = [x for x in self.cached_envs[env] if x != '' and not x.startswith('#')]
-                out = [[y for y in x.split(' ') if y != ''] for x in out]
-                out = [(standarize_package_name(x[0]), x[1].strip()) for x in out if not self.args.pip or x[-1] == 'pypi']
-                
-                installed_packages[env] = set([x[0] for x in out])
-                for package, version in out:
-                    packages_version.setdefault(env, {})[package] = version
-                
-                progress.advance(task)
-
-        env_names = list(installed_packages.keys())
-        env_packages = [installed_packages[env] for env in env_names]
-        common_packages = sorted(list(set.intersection(*env_packages)))
-        distinct_packages = [s - set.union(*(env_packages[:i] + env_packages[i+1:])) for i, s in enumerate(env_packages)]
-        distinct_packages = {env_names[i]: sorted(list(distinct_packages[i])) for i in range(len(env_names))}
-
-        write_cache(self.cached_envs, self.cache_type)
-        display_compare_output(common_packages, distinct_packages, packages_version)
+        # Only the summary is written, a single record type per stream
+        results = self._scan(envs, lambda env: (env, *self._get_packages_version(env)), stream=False)
+
+        packages_version = {env: versions for env, versions in results}
+        with profile_stage('compare'):
+            matrix = IncidenceMatrix(packages_version)
+
+        self.package_store.flush()
+        if self.args.all or self.args.matrix:
+            with profile_stage('compare'):
+                similarity = matrix.jaccard_matrix()
+                near_duplicates = matrix.near_duplicates(similarity, self.args.threshold)
+            with profile_stage('render'):
+                if self.args.format == 'table':
+                    display_matrix_output(matrix, similarity, near_duplicates, self.args.threshold)
+                else:
+                    display_matrix_json_output(matrix, similarity, near_duplicates, self.args.format == 'ndjson')
+            return
+
+        with profile_stage('compare'):
+            common_packages = matrix.common()
+            distinct_packages = matrix.distinct()
+        with profile_stage('render'):
+            if self.args.format == 'table':
+                display_compare_output(common_packages, distinct_packages, packages_version)
+            else:
+                display_compare_json_output(common_packages, distinct_packages, packages_version, self.args.format == 'ndjson')
 
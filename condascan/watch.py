@@ -0,0 +1,263 @@
+import ctypes
+import ctypes.util
+import os
+import os.path as osp
+import select
+import signal
+import struct
+import sys
+import time
+from typing import Dict, Set, Union
+from condascan.cache import CommandCache, PackageStore, get_env_fingerprint
+from condascan.console import console
+from condascan.discovery import get_conda_root, get_envs_dirs, is_conda_prefix
+from condascan.index import PackageIndex
+from condascan.inventory import get_site_packages_dirs
+from condascan.snapshots import is_snapshot_env
+from condascan.task import get_conda_envs, get_env_packages, is_conda_installed
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+# Target of the watched folders whose changes may add or remove environments
+DISCOVER = None
+
+class InotifyWatcher:
+    name = 'inotify'
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = {}
+        self.wds = {}
+
+    def add(self, path: str):
+        if path in self.wds:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            console.print(f'[yellow]:warning: Failed to watch "{path}": {os.strerror(errno)}[/yellow]')
+            return
+        self.wds[path] = wd
+        self.paths[wd] = path
+
+    def remove(self, path: str):
+        wd = self.wds.pop(path, None)
+        if wd is not None:
+            self.paths.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def wait(self, timeout: Union[float, None]) -> Set[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                changed.update(self.wds)
+                continue
+            path = self.paths.get(wd)
+            if path is None:
+                continue
+            changed.add(path)
+            if mask & IN_IGNORED:
+                self.wds.pop(path, None)
+                self.paths.pop(wd, None)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    name = 'polling'
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.signatures = {}
+
+    def _get_signature(self, path: str):
+        signature = []
+        for file in (path, osp.join(path, 'history')) if osp.basename(path) == 'conda-meta' else (path,):
+            try:
+                stat = os.stat(file)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def add(self, path: str):
+        if path not in self.signatures:
+            self.signatures[path] = self._get_signature(path)
+
+    def remove(self, path: str):
+        self.signatures.pop(path, None)
+
+    def wait(self, timeout: Union[float, None]) -> Set[str]:
+        time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+        changed = set()
+        for path, signature in list(self.signatures.items()):
+            new_signature = self._get_signature(path)
+            if new_signature != signature:
+                self.signatures[path] = new_signature
+                changed.add(path)
+        return changed
+
+    def close(self):
+        pass
+
+class EnvWatcher:
+    def __init__(self, watcher: Union[InotifyWatcher, PollingWatcher], debounce: float):
+        self.watcher = watcher
+        self.debounce = debounce
+        self.env_prefixes = {}
+        self.targets = {}
+
+    def _get_targets(self) -> Dict[str, Union[str, None]]:
+        targets = {}
+        root = get_conda_root()
+        if root is not None:
+            targets[osp.expanduser(osp.join('~', '.conda'))] = DISCOVER
+            for envs_dir in get_envs_dirs(root):
+                targets[envs_dir] = DISCOVER
+                try:
+                    children = [osp.join(envs_dir, x) for x in os.listdir(envs_dir)]
+                except OSError:
+                    continue
+                # Folders of environments that are being created, conda-meta appears in them later
+                targets.update((x, DISCOVER) for x in children if osp.isdir(x) and not is_conda_prefix(x))
+        for env, prefix in self.env_prefixes.items():
+            targets[osp.join(prefix, 'conda-meta')] = env
+            targets.update((x, env) for x in get_site_packages_dirs(prefix))
+        return {path: target for path, target in targets.items() if osp.isdir(path)}
+
+    def _update_watches(self):
+        targets = self._get_targets()
+        for path in set(self.targets) - set(targets):
+            self.watcher.remove(path)
+        for path in targets:
+            self.watcher.add(path)
+        self.targets = targets
+
+    def _discover(self) -> Set[str]:
+        env_prefixes = get_conda_envs()
+        added = {env for env, prefix in env_prefixes.items() if self.env_prefixes.get(env) != prefix}
+        removed = [env for env in self.env_prefixes if env not in env_prefixes]
+        self.env_prefixes = env_prefixes
+        for env in removed:
+            console.print(f'[bold]Environment "{env}" was removed[/bold]')
+        return added
+
+    def _refresh(self, envs: Set[str]):
+        # Reload the caches from disk, queries may have written to them since the last refresh
+        in_scope = lambda env: not is_snapshot_env(env)
+        package_store = PackageStore()
+        package_index = PackageIndex()
+        command_cache = CommandCache()
+        package_store.prune(self.env_prefixes, in_scope)
+        package_index.prune(self.env_prefixes, in_scope)
+        command_cache.prune(self.env_prefixes)
+
+        for env in sorted(envs):
+            prefix = self.env_prefixes.get(env)
+            if prefix is None:
+                continue
+            fingerprint = get_env_fingerprint(prefix)
+            if package_index.is_fresh(env, fingerprint) and package_store.get(env, fingerprint) is not None:
+                continue
+
+            start = time.perf_counter()
+            packages = get_env_packages(prefix)
+            if packages is None:
+                console.print(f'[yellow]:warning: Failed to read the installed packages of "{env}"[/yellow]')
+                continue
+            package_store.set(env, fingerprint, packages)
+            package_index.update_env(env, fingerprint, packages)
+            command_cache.invalidate(env)
+            console.print(f'[green]:heavy_check_mark: Indexed "{env}" ({len(packages)} packages) in {(time.perf_counter() - start) * 1000:.0f} ms[/green]')
+
+        package_store.flush()
+        package_index.flush()
+        command_cache.flush()
+
+    def run(self):
+        self.env_prefixes = get_conda_envs()
+        self._refresh(set(self.env_prefixes))
+        self._update_watches()
+        console.print(f'[green]:heavy_check_mark: Watching {len(self.env_prefixes)} environments using {self.watcher.name}. Press Ctrl+C to stop[/green]')
+
+        pending = set()
+        discover = False
+        last_event = None
+        while True:
+            timeout = None if last_event is None else max(0.0, last_event + self.debounce - time.monotonic())
+            changed = self.watcher.wait(timeout)
+            if len(changed) > 0:
+                for path in changed:
+                    target = self.targets.get(path, DISCOVER)
+                    if target is DISCOVER:
+                        discover = True
+                    else:
+                        pending.add(target)
+                last_event = time.monotonic()
+                continue
+
+            if last_event is not None and time.monotonic() - last_event >= self.debounce:
+                if discover:
+                    pending |= self._discover()
+                self._refresh(pending)
+                self._update_watches()
+                pending = set()
+                discover = False
+                last_event = None
+
+def watch(debounce: float, interval: float, polling: bool = False):
+    if debounce < 0:
+        console.print('[red]Debounce argument must not be negative[/red]')
+        sys.exit(1)
+    if interval <= 0:
+        console.print('[red]Interval argument must be greater than 0[/red]')
+        sys.exit(1)
+    if not is_conda_installed():
+        console.print('[red]:x: Conda is not installed or not found in PATH[/red]')
+        sys.exit(1)
+
+    watcher = None
+    if not polling:
+        try:
+            watcher = InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            console.print(f'[yellow]:warning: inotify is not available ({str(e)}), checking for changes every {interval} seconds instead[/yellow]')
+    if watcher is None:
+        watcher = PollingWatcher(interval)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        EnvWatcher(watcher, debounce).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,9 @@
+import pytest
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    # The caches live under ~/.cache/condascan, keep them out of the real home folder
+    home = tmp_path / 'home'
+    home.mkdir()
+    monkeypatch.setenv('HOME', str(home))
+    return home
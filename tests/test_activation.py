@@ -0,0 +1,17 @@
+import os
+import pytest
+from condascan.activation import run_activate_scripts
+
+@pytest.mark.skipif(os.name == 'nt', reason='activate.d scripts are sourced by a POSIX shell')
+def test_run_activate_scripts_quotes_paths(tmp_path):
+    script_dir = tmp_path / 'env "$HOME" `false`'
+    script_dir.mkdir()
+    (script_dir / 'activate.sh').write_text('export CONDASCAN_ACTIVATED=1\n')
+    activated = run_activate_scripts([str(script_dir / 'activate.sh')], dict(os.environ))
+    assert activated is not None
+    assert activated['CONDASCAN_ACTIVATED'] == '1'
+
+@pytest.mark.skipif(os.name == 'nt', reason='activate.d scripts are sourced by a POSIX shell')
+def test_run_activate_scripts_failure(tmp_path):
+    (tmp_path / 'activate.sh').write_text('return 1\n')
+    assert run_activate_scripts([str(tmp_path / 'activate.sh')], dict(os.environ)) is None
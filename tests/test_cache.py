@@ -0,0 +1,131 @@
+import json
+import os.path as osp
+from condascan import cache
+from condascan.cache import CacheType, CommandCache, get_and_create_cache_path
+
+def test_get_returns_cached_result():
+    command_cache = CommandCache()
+    command_cache.set('env', 'fp1', 'python --version', (True, '3.11.7'))
+    assert command_cache.get('env', 'fp1', 'python --version') == (True, '3.11.7')
+    assert command_cache.get('env', 'fp1', 'gcc --version') is None
+    assert command_cache.get('other', 'fp1', 'python --version') is None
+
+def test_flush_persists_entries():
+    command_cache = CommandCache()
+    command_cache.set('env', 'fp1', 'ls', (False, 'Exited with code 2'))
+    command_cache.flush()
+
+    assert CommandCache().get('env', 'fp1', 'ls') == (False, 'Exited with code 2')
+
+def test_flush_removes_legacy_cache():
+    legacy_path = get_and_create_cache_path(CacheType.LEGACY_COMMANDS)
+    with open(legacy_path, 'w') as f:
+        json.dump({}, f)
+    command_cache = CommandCache()
+    command_cache.set('env', 'fp1', 'ls', (True, ''))
+    command_cache.flush()
+
+    assert not osp.exists(legacy_path)
+
+def test_fingerprint_change_invalidates_all_commands_of_env():
+    command_cache = CommandCache()
+    command_cache.set('env', 'fp1', 'ls', (True, ''))
+    command_cache.set('env', 'fp1', 'gcc --version', (True, 'gcc 13'))
+    command_cache.set('other', 'fp9', 'ls', (True, ''))
+
+    assert command_cache.get('env', 'fp2', 'ls') is None
+    assert command_cache.get('env', 'fp1', 'gcc --version') is None
+    assert command_cache.get('other', 'fp9', 'ls') == (True, '')
+
+def test_set_with_new_fingerprint_drops_old_entries():
+    command_cache = CommandCache()
+    command_cache.set('env', 'fp1', 'ls', (True, ''))
+    command_cache.set('env', 'fp2', 'gcc --version', (True, 'gcc 13'))
+
+    assert ('env', 'ls') not in command_cache.entries
+    assert command_cache.get('env', 'fp2', 'gcc --version') == (True, 'gcc 13')
+
+def test_least_recently_used_entry_is_evicted():
+    command_cache = CommandCache(max_entries=2)
+    command_cache.set('a', 'fp', 'ls', (True, ''))
+    command_cache.set('b', 'fp', 'ls', (True, ''))
+    command_cache.get('a', 'fp', 'ls')
+    command_cache.set('c', 'fp', 'ls', (True, ''))
+
+    assert command_cache.get('a', 'fp', 'ls') is not None
+    assert command_cache.get('b', 'fp', 'ls') is None
+    assert command_cache.get('c', 'fp', 'ls') is not None
+    assert 'b' not in command_cache.env_commands
+
+def test_flush_evicts_down_to_max_entries():
+    command_cache = CommandCache()
+    for env in ['a', 'b', 'c']:
+        command_cache.set(env, 'fp', 'ls', (True, ''))
+    command_cache.max_entries = 1
+    command_cache.flush()
+
+    assert list(command_cache.entries) == [('c', 'ls')]
+    assert list(CommandCache().entries) == [('c', 'ls')]
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    command_cache = CommandCache(ttl=60)
+    command_cache.set('env', 'fp', 'ls', (True, ''))
+    command_cache.set('env', 'fp', 'pwd', (True, '/'))
+
+    now[0] += 30
+    assert command_cache.get('env', 'fp', 'ls') == (True, '')
+    now[0] += 31
+    assert command_cache.get('env', 'fp', 'ls') is None
+    command_cache.flush()
+    assert command_cache.entries == {}
+
+def test_ttl_is_disabled_with_none(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    command_cache = CommandCache(ttl=None)
+    command_cache.set('env', 'fp', 'ls', (True, ''))
+
+    now[0] += 10 ** 9
+    assert command_cache.get('env', 'fp', 'ls') == (True, '')
+
+def test_no_cache_ignores_but_keeps_entries():
+    command_cache = CommandCache()
+    command_cache.set('env', 'fp', 'ls', (True, ''))
+    command_cache.set('other', 'fp', 'ls', (True, ''))
+    command_cache.flush()
+
+    command_cache = CommandCache(use_cache=False)
+    assert command_cache.get('env', 'fp', 'ls') is None
+    assert command_cache.peek('env', 'ls') is None
+    command_cache.set('env', 'fp', 'ls', (False, 'error'))
+    command_cache.flush()
+
+    command_cache = CommandCache()
+    assert command_cache.get('env', 'fp', 'ls') == (False, 'error')
+    assert command_cache.get('other', 'fp', 'ls') == (True, '')
+
+def test_peek_keeps_entries_of_changed_env():
+    command_cache = CommandCache()
+    command_cache.set('env', 'fp1', 'ls', (True, ''))
+
+    assert command_cache.peek('env', 'ls') == ('fp1', True)
+    assert command_cache.peek('env', 'pwd') is None
+    assert ('env', 'ls') in command_cache.entries
+
+def test_prune_removes_missing_envs():
+    command_cache = CommandCache()
+    command_cache.set('kept', 'fp', 'ls', (True, ''))
+    command_cache.set('removed', 'fp', 'ls', (True, ''))
+    command_cache.prune(['kept'])
+
+    assert command_cache.get('kept', 'fp', 'ls') is not None
+    assert 'removed' not in command_cache.env_commands
+
+def test_corrupted_cache_file_is_ignored():
+    with open(get_and_create_cache_path(CacheType.COMMANDS), 'w') as f:
+        f.write('{"entries": [["env", "ls"]]}')
+
+    command_cache = CommandCache()
+    assert len(command_cache.entries) == 0
@@ -0,0 +1,88 @@
+import json
+from condascan.inventory import build_package_records, get_metadata_path, read_conda_meta, read_metadata_headers, read_pip_packages
+
+def make_prefix(tmp_path, conda_records=()):
+    prefix = tmp_path / 'env'
+    (prefix / 'conda-meta').mkdir(parents=True)
+    for record in conda_records:
+        with open(prefix / 'conda-meta' / f'{record["name"]}-{record["version"]}-{record["build"]}.json', 'w') as f:
+            json.dump(record, f)
+    site_packages = prefix / 'lib' / 'python3.11' / 'site-packages'
+    site_packages.mkdir(parents=True)
+    return prefix, site_packages
+
+def test_read_metadata_headers_stops_at_body(tmp_path):
+    path = tmp_path / 'METADATA'
+    path.write_text('Metadata-Version: 2.1\nName: Foo.Bar\nVersion: 1.2.post1\n\nName: not-a-header\nVersion: 0\n')
+    assert read_metadata_headers(str(path)) == ('Foo.Bar', '1.2.post1')
+
+def test_read_metadata_headers_missing_values(tmp_path):
+    path = tmp_path / 'PKG-INFO'
+    path.write_text('Metadata-Version: 1.0\nName: legacy\n\nVersion: 1.0\n')
+    assert read_metadata_headers(str(path)) == ('legacy', None)
+    assert read_metadata_headers(str(tmp_path / 'missing')) == (None, None)
+
+def test_get_metadata_path():
+    assert get_metadata_path('lib/python3.11/site-packages/numpy-1.26.4.dist-info/RECORD') == 'lib/python3.11/site-packages/numpy-1.26.4.dist-info'
+    assert get_metadata_path('lib/python3.11/site-packages/six-1.16.0-py3.11.egg-info') == 'lib/python3.11/site-packages/six-1.16.0-py3.11.egg-info'
+    assert get_metadata_path('lib/python3.11/site-packages/six.py') is None
+
+def test_read_pip_packages(tmp_path):
+    prefix, site_packages = make_prefix(tmp_path)
+    (site_packages / 'Foo_Bar-1.2.dist-info').mkdir()
+    (site_packages / 'Foo_Bar-1.2.dist-info' / 'METADATA').write_text('Name: Foo_Bar\nVersion: 1.2\n')
+    (site_packages / 'legacy_pkg-0.3-py3.11.egg-info').mkdir()
+    (site_packages / 'legacy_pkg-0.3-py3.11.egg-info' / 'PKG-INFO').write_text('Name: legacy-pkg\nVersion: 0.3\n')
+    (site_packages / 'single-9.0-py3.11.egg-info').write_text('Name: single\nVersion: 9.0\n')
+    (site_packages / 'foo_bar').mkdir()
+
+    records = read_pip_packages(str(prefix), set(), set())
+    assert sorted(records) == [
+        ('Foo_Bar', '1.2', 'pypi_0', 'pypi', 'dist-info'),
+        ('legacy-pkg', '0.3', 'pypi_0', 'pypi', 'egg-info'),
+        ('single', '9.0', 'pypi_0', 'pypi', 'egg-info'),
+    ]
+
+def test_read_pip_packages_falls_back_to_folder_name(tmp_path):
+    prefix, site_packages = make_prefix(tmp_path)
+    (site_packages / 'broken-2.0.dist-info').mkdir()
+    (site_packages / 'old_style-1.5-py2.7.egg-info').mkdir()
+    (site_packages / 'noversion.egg-info').mkdir()
+
+    records = read_pip_packages(str(prefix), set(), set())
+    assert sorted(records) == [
+        ('broken', '2.0', 'pypi_0', 'pypi', 'dist-info'),
+        ('old_style', '1.5', 'pypi_0', 'pypi', 'egg-info'),
+    ]
+
+def test_read_pip_packages_skips_conda_packages(tmp_path):
+    prefix, site_packages = make_prefix(tmp_path)
+    for entry in ['numpy-1.26.4.dist-info', 'requests-2.31.0.dist-info', 'six-1.16.0-py3.11.egg-info']:
+        (site_packages / entry).mkdir()
+
+    conda_owned = {'lib/python3.11/site-packages/numpy-1.26.4.dist-info', 'lib/python3.11/site-packages/six-1.16.0-py3.11.egg-info'}
+    records = read_pip_packages(str(prefix), conda_owned, {'requests'})
+    assert records == []
+
+def test_read_pip_packages_keeps_first_duplicate(tmp_path):
+    prefix, site_packages = make_prefix(tmp_path)
+    (site_packages / 'Foo-1.0.dist-info').mkdir()
+    (site_packages / 'foo-2.0.egg-info').mkdir()
+
+    assert read_pip_packages(str(prefix), set(), set()) == [('Foo', '1.0', 'pypi_0', 'pypi', 'dist-info')]
+
+def test_read_conda_meta_merges_pip_records(tmp_path):
+    numpy = {'name': 'numpy', 'version': '1.26.4', 'build': 'py311h64a7726_0', 'channel': 'https://conda.anaconda.org/conda-forge/linux-64', 'files': ['lib/python3.11/site-packages/numpy-1.26.4.dist-info/METADATA']}
+    prefix, site_packages = make_prefix(tmp_path, [numpy])
+    (site_packages / 'numpy-1.26.4.dist-info').mkdir()
+    (site_packages / 'Typing_Extensions-4.9.0.dist-info').mkdir()
+    (site_packages / 'Typing_Extensions-4.9.0.dist-info' / 'METADATA').write_text('Name: typing_extensions\nVersion: 4.9.0\n')
+
+    packages = build_package_records(read_conda_meta(str(prefix)))
+    assert packages == {
+        'numpy': ('1.26.4', 'py311h64a7726_0', 'conda-forge', 'conda-meta'),
+        'typing-extensions': ('4.9.0', 'pypi_0', 'pypi', 'dist-info'),
+    }
+
+def test_read_conda_meta_without_conda_meta(tmp_path):
+    assert read_conda_meta(str(tmp_path)) is None
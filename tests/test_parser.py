@@ -0,0 +1,25 @@
+import pytest
+from condascan.parser import parse_batch
+
+def test_parse_batch_expands_directories(tmp_path):
+    (tmp_path / 'ci').mkdir()
+    for name in ['b.txt', 'a.yml', 'c.yaml', 'notes.md', 'reqs.in']:
+        (tmp_path / 'ci' / name).write_text('numpy\n')
+    (tmp_path / 'ci' / 'nested.txt').mkdir()
+    (tmp_path / 'extra.txt').write_text('pandas\n')
+
+    files = parse_batch([str(tmp_path / 'ci'), str(tmp_path / 'extra.txt'), str(tmp_path / 'ci' / 'b.txt')])
+    assert files == [str(tmp_path / 'ci' / x) for x in ['a.yml', 'b.txt', 'c.yaml']] + [str(tmp_path / 'extra.txt')]
+
+def test_parse_batch_rejects_other_files(tmp_path):
+    (tmp_path / 'reqs.in').write_text('numpy\n')
+    with pytest.raises(SystemExit):
+        parse_batch([str(tmp_path / 'reqs.in')])
+
+def test_parse_batch_rejects_missing_files(tmp_path):
+    with pytest.raises(SystemExit):
+        parse_batch([str(tmp_path / 'missing.txt')])
+
+def test_parse_batch_rejects_empty_directories(tmp_path):
+    with pytest.raises(SystemExit):
+        parse_batch([str(tmp_path)])
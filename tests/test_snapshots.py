@@ -0,0 +1,78 @@
+import json
+import os.path as osp
+from condascan.snapshots import find_snapshots, get_snapshot_cache_prefix, get_snapshot_name, is_snapshot_env, parse_conda_list_json, parse_conda_list_text, read_snapshot
+
+def test_get_snapshot_name(tmp_path):
+    root = str(tmp_path / 'fleet')
+    assert get_snapshot_name(root, osp.join(root, 'node01', 'torch.txt'), False) == 'node01:torch'
+    assert get_snapshot_name(root, osp.join(root, 'node01', 'envs', 'torch'), True) == 'node01:torch'
+    assert get_snapshot_name(root, osp.join(root, 'node01'), True) == 'node01:base'
+    assert get_snapshot_name(root, osp.join(root, 'torch.yml'), False) == 'fleet:torch'
+    assert get_snapshot_name(root, root, True) == 'fleet:base'
+    assert get_snapshot_name(root, osp.join(root, 'node01', 'team', 'torch.json'), False) == 'node01:team/torch'
+
+def test_get_snapshot_cache_prefix(tmp_path):
+    prefix = get_snapshot_cache_prefix(str(tmp_path / 'fleet'))
+    assert prefix == get_snapshot_cache_prefix(str(tmp_path / 'fleet' / '.'))
+    assert prefix != get_snapshot_cache_prefix(str(tmp_path / 'other'))
+    assert is_snapshot_env(prefix + 'node01:torch')
+
+def test_is_snapshot_env():
+    assert is_snapshot_env('node01:torch')
+    assert is_snapshot_env('c:base')
+    assert not is_snapshot_env('torch')
+    assert not is_snapshot_env('/opt/envs/a:b')
+    assert not is_snapshot_env('C:\\Users\\me\\envs\\torch')
+
+def test_parse_conda_list_text_columns():
+    lines = [
+        '# packages in environment at /opt/conda/envs/torch:',
+        '#',
+        '# Name                    Version                   Build  Channel',
+        'numpy                     1.26.4          py311h64a7726_0    conda-forge',
+        'requests                  2.31.0                   pypi_0    pypi',
+        'zlib                      1.2.13               h5eee18b_1',
+    ]
+    assert parse_conda_list_text(lines) == [
+        ('numpy', '1.26.4', 'py311h64a7726_0', 'conda-forge', 'conda-list'),
+        ('requests', '2.31.0', 'pypi_0', 'pypi', 'conda-list'),
+        ('zlib', '1.2.13', 'h5eee18b_1', '', 'conda-list'),
+    ]
+
+def test_parse_conda_list_text_export():
+    lines = [
+        '# This file may be used to create an environment using:',
+        '# $ conda create --name <env> --file <this file>',
+        '# platform: linux-64',
+        '@EXPLICIT',
+        'conda-forge::numpy=1.26.4=py311h64a7726_0',
+        'requests=2.31.0=pypi_0',
+        'zlib=1.2.13=h5eee18b_1',
+    ]
+    assert parse_conda_list_text(lines) == [
+        ('numpy', '1.26.4', 'py311h64a7726_0', 'conda-forge', 'conda-list'),
+        ('requests', '2.31.0', 'pypi_0', 'pypi', 'conda-list'),
+        ('zlib', '1.2.13', 'h5eee18b_1', '', 'conda-list'),
+    ]
+
+def test_parse_conda_list_json():
+    text = json.dumps([
+        {'name': 'numpy', 'version': '1.26.4', 'build_string': 'py311h64a7726_0', 'channel': 'conda-forge'},
+        {'name': 'zlib', 'version': '1.2.13', 'build_string': 'h5eee18b_1', 'channel': 'pkgs/main'},
+    ])
+    assert parse_conda_list_json(text) == [
+        ('numpy', '1.26.4', 'py311h64a7726_0', 'conda-forge', 'conda-list'),
+        ('zlib', '1.2.13', 'h5eee18b_1', '', 'conda-list'),
+    ]
+
+def test_find_and_read_snapshots(tmp_path):
+    (tmp_path / 'node01').mkdir()
+    (tmp_path / 'node01' / 'torch.txt').write_text('numpy=1.26.4=py311h64a7726_0\n')
+    (tmp_path / 'node01' / 'notes.md').write_text('not a snapshot')
+    (tmp_path / 'node02' / 'conda-meta').mkdir(parents=True)
+    (tmp_path / 'node02' / 'envs' / 'cuda' / 'conda-meta').mkdir(parents=True)
+
+    snapshots = find_snapshots(str(tmp_path))
+    assert list(snapshots) == ['node01:torch', 'node02:base', 'node02:cuda']
+    assert read_snapshot(snapshots['node01:torch']) == {'numpy': ('1.26.4', 'py311h64a7726_0', '', 'conda-list')}
+    assert read_snapshot(snapshots['node02:base']) == {}
@@ -0,0 +1,12 @@
+import os.path as osp
+import sys
+
+sys.path.insert(0, osp.join(osp.dirname(osp.dirname(osp.abspath(__file__))), 'benchmarks'))
+from bench_startup import LAZY_MODULES, measure_import
+
+# Only the modules are checked, the import time budget is left to benchmarks/bench_startup.py
+def test_cli_import_is_lazy():
+    _, modules = measure_import()
+    assert 'condascan.cli' in modules
+    eager = sorted(x for x in modules if any(x == y or x.startswith(y + '.') for y in LAZY_MODULES))
+    assert eager == []